@@ -1,15 +1,203 @@
-from django.contrib import admin
-from .models import CoffeeShop, Worker, Shift
+from datetime import timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+from .bulk import apply_edits
+from .cache import bump_schedule_version
+from .conflicts import cell_conflict
+from .journal import ChangeBuffer, actor_of, journal_context, shift_state
+from .models import CoffeeShop, Worker, Shift, ShiftChange, SwapCounter
+from .schedule import month_bounds
+
+# правки из админки не упираются в лимит интерактивного редактора
+ADMIN_MAX_CELLS = 100000
+# меньше этого считаем честно, больше — оцениваем
+ESTIMATE_COUNT_FROM = 10000
+
+
+def estimated_count(model):
+    """
+    Примерное число строк таблицы без COUNT(*) по всей таблице: в PostgreSQL —
+    статистика планировщика, в SQLite — MAX(id) (одно чтение края индекса;
+    удалённые строки не вычитаются).
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [model._meta.db_table])
+            row = cursor.fetchone()
+            return int(row[0]) if row else 0
+    return model._default_manager.aggregate(n=Max('pk'))['n'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Для нефильтрованного списка большой таблицы отдаёт оценку вместо COUNT(*)."""
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where:
+            estimate = estimated_count(query.model)
+            if estimate > ESTIMATE_COUNT_FROM:
+                return estimate
+        return super().count
+
 
 # Register your models here.
 @admin.register(CoffeeShop)
 class CoffeeShopAdmin(admin.ModelAdmin):
-    list_display = ('name', 'minimum_workers',)
+    list_display = ('name', 'short_code', 'minimum_workers',)
+    search_fields = ('name', 'short_code',)
 
 @admin.register(Worker)
 class WorkerAdmin(admin.ModelAdmin):
     list_display = ('name', 'phone_number', 'experience_years', 'start_date_experience_years', 'hourly_rate', 'coffee_shop',)
+    list_select_related = ('coffee_shop',)
+    list_filter = ('coffee_shop',)
+    search_fields = ('name', 'phone_number',)
+    autocomplete_fields = ('coffee_shop',)
+
+class ShiftAdminForm(forms.ModelForm):
+    """Те же проверки ячейки, что у apply_edits: без двойной занятости и чужой точки."""
+
+    class Meta:
+        model = Shift
+        fields = '__all__'
+
+    def clean(self):
+        cleaned = super().clean()
+        worker = cleaned.get('worker')
+        if worker is None:
+            return cleaned
+        if cleaned.get('coffee_shop') and cleaned['coffee_shop'] != worker.coffee_shop:
+            raise forms.ValidationError(
+                f"{worker.name} работает в {worker.coffee_shop}, а не в {cleaned['coffee_shop']}"
+            )
+        other = cleaned.get('other_coffee_shop')
+        conflict = cell_conflict(worker, cleaned.get('start_time'), other.id if other else None)
+        if conflict:
+            raise forms.ValidationError(conflict)
+        return cleaned
 
 @admin.register(Shift)
 class ShiftAdmin(admin.ModelAdmin):
-    list_display = ('worker', 'coffee_shop', 'date', 'start_time',)
\ No newline at end of file
+    form = ShiftAdminForm
+    list_display = ('worker', 'coffee_shop', 'date', 'start_time', 'other_coffee_shop', 'display_value',)
+    list_select_related = ('worker', 'coffee_shop', 'other_coffee_shop')
+    list_filter = ('coffee_shop', 'start_time',)
+    date_hierarchy = 'date'
+    search_fields = ('worker__name',)
+    autocomplete_fields = ('worker', 'coffee_shop', 'other_coffee_shop',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 100
+    actions = ('copy_to_next_week', 'clear_months',)
+
+    def save_model(self, request, obj, form, change):
+        old = Shift.objects.filter(pk=obj.pk).first() if change else None
+        super().save_model(request, obj, form, change)
+        journal = ChangeBuffer('admin', actor_of(request))
+        if old is not None and (old.worker_id, old.date) != (obj.worker_id, obj.date):
+            # ячейку перенесли: старая опустела, новая заполнилась
+            journal.shift(old.worker_id, old.coffee_shop_id, old.date, shift_state(old), None)
+            old = None
+        journal.shift(obj.worker_id, obj.coffee_shop_id, obj.date, shift_state(old), shift_state(obj))
+        journal.flush()
+        # DailyCoverage и версии графиков (старое и новое место ячейки,
+        # точка подработки) ведут сигналы Shift
+
+    def delete_model(self, request, obj):
+        # удаление журналирует сигнал post_delete, мы только подписываем его
+        with journal_context('admin', actor_of(request)):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with journal_context('admin', actor_of(request)):
+            super().delete_queryset(request, queryset)
+
+    @admin.action(description='Скопировать выбранные смены на неделю вперёд')
+    def copy_to_next_week(self, request, queryset):
+        edits = [
+            {
+                'worker_id': worker_id,
+                'date': (d + timedelta(days=7)).isoformat(),
+                'start_time': start_time,
+                'other_cafe_id': other_cafe_id,
+                'display_value': display_value,
+            }
+            for worker_id, d, start_time, other_cafe_id, display_value in queryset.order_by().values_list(
+                'worker_id', 'date', 'start_time', 'other_coffee_shop_id', 'display_value',
+            )
+        ]
+        self._apply(request, edits, 'Скопировано на неделю вперёд')
+
+    @admin.action(description='Очистить месяцы выбранных смен на их точках')
+    def clear_months(self, request, queryset):
+        months = set(queryset.order_by().values_list('coffee_shop_id', 'date__year', 'date__month').distinct())
+        edits = []
+        for cafe_id, year, month in months:
+            start, end = month_bounds(year, month)
+            edits += [
+                {'worker_id': worker_id, 'date': d.isoformat()}
+                for worker_id, d in Shift.objects
+                .filter(coffee_shop_id=cafe_id, date__gte=start, date__lte=end)
+                .exclude(start_time=None, other_coffee_shop=None, display_value=None)
+                .order_by()
+                .values_list('worker_id', 'date')
+            ]
+        self._apply(request, edits, 'Очищено')
+
+    def _apply(self, request, edits, done):
+        # через apply_edits: один upsert, пересчёт покрытия, outbox и кеши
+        try:
+            cells, _ = apply_edits(edits, max_cells=ADMIN_MAX_CELLS, source='admin', actor=actor_of(request))
+        except Exception as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        self.message_user(request, f'{done}: изменено ячеек {len(cells)}', messages.SUCCESS)
+
+@admin.register(SwapCounter)
+class SwapCounterAdmin(admin.ModelAdmin):
+    list_display = ('worker', 'month', 'swaps_this_month', 'updated_at',)
+    list_select_related = ('worker',)
+    list_filter = ('worker__coffee_shop',)
+    date_hierarchy = 'month'
+    search_fields = ('worker__name',)
+    autocomplete_fields = ('worker',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        old = None
+        if change:
+            old = SwapCounter.objects.filter(pk=obj.pk).values_list('swaps_this_month', flat=True).first()
+        super().save_model(request, obj, form, change)
+        journal = ChangeBuffer('admin', actor_of(request))
+        journal.swaps(obj.worker_id, obj.worker.coffee_shop_id, obj.month, old, obj.swaps_this_month)
+        journal.flush()
+        transaction.on_commit(lambda: bump_schedule_version(obj.worker.coffee_shop_id, obj.month))
+
+@admin.register(ShiftChange)
+class ShiftChangeAdmin(admin.ModelAdmin):
+    """Журнал только читается: ни добавить, ни поправить, ни удалить запись нельзя."""
+    list_display = ('created_at', 'kind', 'worker', 'cafe', 'date', 'old_value', 'new_value', 'source', 'actor',)
+    list_select_related = ('worker', 'cafe')
+    list_filter = ('kind', 'source', 'cafe',)
+    date_hierarchy = 'date'
+    search_fields = ('worker__name', 'actor',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 100
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,148 @@
+# main/archive.py
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .cache import bump_schedule_version
+from .models import (
+    CafeMonthSummary, CoffeeShop, DailyCoverage, Shift, ShiftArchive, SwapCounter, WorkerMonthSummary,
+)
+from .payroll import lent_shift_start
+from .schedule import archive_horizon, month_bounds
+
+ARCHIVE_BATCH = 2000
+ARCHIVE_FIELDS = ('worker_id', 'coffee_shop_id', 'date', 'start_time', 'other_coffee_shop_id',
+                  'display_value', 'updated_at')
+
+
+def months_to_archive(today=None):
+    """Месяцы, которые ещё лежат в Shift, хотя уже за горизонтом."""
+    horizon = archive_horizon(today)
+    if horizon is None:
+        return []
+    return list(Shift.objects.filter(date__lt=horizon).dates('date', 'month'))
+
+
+def _move_rows(start, end):
+    """Переносит смены диапазона в ShiftArchive пачками и удаляет их из Shift."""
+    moved = 0
+    batch = []
+    rows = Shift.objects.filter(date__gte=start, date__lte=end).order_by().values_list(*ARCHIVE_FIELDS)
+    for row in rows.iterator(chunk_size=ARCHIVE_BATCH):
+        batch.append(ShiftArchive(**dict(zip(ARCHIVE_FIELDS, row))))
+        if len(batch) == ARCHIVE_BATCH:
+            moved += _flush(batch)
+            batch = []
+    moved += _flush(batch)
+
+    # удаляем напрямую, мимо сигналов: DailyCoverage за архивный месяц
+    # должно остаться таким, каким было, — по нему строятся красные дни
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {Shift._meta.db_table} WHERE date >= %s AND date <= %s', [start, end],
+        )
+    return moved
+
+
+def _flush(batch):
+    # ячейку, поправленную после прошлой архивации, перезаписываем
+    ShiftArchive.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['worker', 'date'],
+        update_fields=['coffee_shop', 'start_time', 'other_coffee_shop', 'display_value', 'updated_at'],
+    )
+    return len(batch)
+
+
+def _rollup(month_start, month_end):
+    """Пересчитывает итоги месяца по ShiftArchive — два upsert'а."""
+    lent_default = lent_shift_start()
+    workers, cafes = {}, {}
+
+    def cafe_summary(cafe_id):
+        return cafes.setdefault(cafe_id, CafeMonthSummary(cafe_id=cafe_id, month=month_start))
+
+    for worker_id, cafe_id, start_time, other_cafe_id, display_value, n in (
+        ShiftArchive.objects
+        .filter(date__gte=month_start, date__lte=month_end)
+        .order_by()
+        .values_list('worker_id', 'coffee_shop_id', 'start_time', 'other_coffee_shop_id', 'display_value')
+        .annotate(n=Count('id'))
+    ):
+        summary = workers.setdefault(worker_id, WorkerMonthSummary(worker_id=worker_id, cafe_id=cafe_id, month=month_start))
+        if other_cafe_id:
+            key = str(other_cafe_id)
+            summary.lent[key] = summary.lent.get(key, 0) + n
+            summary.hours += n * Shift.shift_hours(start_time or lent_default)
+            cafe_summary(cafe_id).lent_days += n
+            cafe_summary(other_cafe_id).borrowed_days += n
+        elif start_time:
+            summary.by_start_time[start_time] = summary.by_start_time.get(start_time, 0) + n
+            summary.hours += n * Shift.shift_hours(start_time)
+            own = cafe_summary(cafe_id).by_start_time
+            own[start_time] = own.get(start_time, 0) + n
+        elif display_value == '+':
+            summary.plus_days += n
+
+    for worker_id, swaps in SwapCounter.objects.filter(month=month_start).values_list('worker_id', 'swaps_this_month'):
+        if worker_id in workers:
+            workers[worker_id].swaps = swaps
+            cafe_summary(workers[worker_id].cafe_id).swaps += swaps
+
+    # итоги за месяц есть у каждой точки, даже если смен в ней не было
+    for cafe_id in CoffeeShop.objects.values_list('id', flat=True):
+        cafe_summary(cafe_id)
+
+    days = month_end.day
+    staffed = {}
+    for cafe_id, staffed_count, minimum in (
+        DailyCoverage.objects
+        .filter(date__gte=month_start, date__lte=month_end)
+        .values_list('cafe_id', 'staffed_count', 'cafe__minimum_workers')
+    ):
+        if staffed_count >= minimum:
+            staffed[cafe_id] = staffed.get(cafe_id, 0) + 1
+    for summary in cafes.values():
+        summary.understaffed_days = days - staffed.get(summary.cafe_id, 0)
+
+    WorkerMonthSummary.objects.bulk_create(
+        workers.values(),
+        update_conflicts=True,
+        unique_fields=['worker', 'month'],
+        update_fields=['cafe', 'by_start_time', 'lent', 'plus_days', 'hours', 'swaps'],
+    )
+    CafeMonthSummary.objects.bulk_create(
+        cafes.values(),
+        update_conflicts=True,
+        unique_fields=['cafe', 'month'],
+        update_fields=['by_start_time', 'borrowed_days', 'lent_days', 'understaffed_days', 'swaps'],
+    )
+    return set(cafes)
+
+
+@transaction.atomic
+def archive_month(year, month):
+    """
+    Уносит месяц в архив одной транзакцией: смены переезжают в ShiftArchive,
+    итоги по работникам и точкам пересчитываются по архиву целиком — так
+    повторный запуск после поздних правок ничего не теряет. Возвращает
+    число перенесённых смен.
+    """
+    month_start, month_end = month_bounds(year, month)
+    moved = _move_rows(month_start, month_end)
+    affected = _rollup(month_start, month_end)
+    for cafe_id in affected:
+        transaction.on_commit(lambda cafe_id=cafe_id: bump_schedule_version(cafe_id, month_start))
+    return moved
+
+
+def summaries_by_cafe(start, end):
+    """Итоги точек за архивные месяцы диапазона — один запрос."""
+    return [
+        {**row, 'month': f"{row['month'].year}-{row['month'].month:02d}"}
+        for row in CafeMonthSummary.objects
+        .filter(month__gte=start, month__lte=end)
+        .order_by('month', 'cafe_id')
+        .values('cafe_id', 'cafe__name', 'month', 'by_start_time', 'borrowed_days',
+                'lent_days', 'understaffed_days', 'swaps')
+    ]
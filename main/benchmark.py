@@ -0,0 +1,200 @@
+# main/benchmark.py
+import json
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .models import Worker
+from .seeding import seed_schedule
+
+
+def parse_size(size):
+    """'3x15x6' -> (точек, работников на точку, месяцев)."""
+    cafes, workers, months = (int(part) for part in size.split('x'))
+    return cafes, workers, months
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(call, repeat):
+    """
+    Гоняет call() repeat раз: латентность в мс и максимум SQL-запросов.
+    Пик памяти в КБ снимается отдельным проходом — под tracemalloc код
+    работает в разы медленнее и портил бы латентность.
+    """
+    call(repeat)  # прогрев: первый вызов после засева платит за холодный кеш страниц SQLite
+    timings, queries = [], []
+    for i in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = call(i)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(ctx.captured_queries))
+        if response.status_code >= 400:
+            raise RuntimeError(f'{response.status_code}: {response.content[:200]!r}')
+
+    peak = 0
+    for i in range(min(repeat, 3)):
+        tracemalloc.start()
+        call(repeat + 1 + i)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_size(size, repeat):
+    """Засевает пустую базу данными размера size и меряет эндпоинты графика."""
+    cafes, workers, months = parse_size(size)
+    call_command('flush', interactive=False, verbosity=0)
+    shops = seed_schedule(cafes, workers, months, rng=random.Random(0))
+    cafe = shops[0]
+    worker_ids = list(Worker.objects.filter(coffee_shop=cafe).values_list('id', flat=True))
+    today = date.today()
+    client = Client()
+
+    def schedule_cold(i):
+        cache.clear()
+        return client.get(f'/api/schedule/{cafe.id}/')
+
+    def schedule_cached(i):
+        return client.get(f'/api/schedule/{cafe.id}/')
+
+    def update_shift(i):
+        return client.post('/api/shift/update/', json.dumps({
+            'worker_id': worker_ids[i % len(worker_ids)],
+            'date': (today.replace(day=1) + timedelta(days=i % 28)).isoformat(),
+            'start_time': ['07:30', '08:00', '10:00'][i % 3],
+        }), content_type='application/json')
+
+    def increment_swap(i):
+        return client.post('/api/swap/increment/', json.dumps({
+            'worker_id': worker_ids[i % len(worker_ids)],
+        }), content_type='application/json')
+
+    return {
+        'schedule_cold': measure(schedule_cold, repeat),
+        'schedule_cached': measure(schedule_cached, repeat),
+        'update_shift': measure(update_shift, repeat),
+        'increment_swap': measure(increment_swap, repeat),
+    }
+
+
+# Абсолютный запас сверх baseline: на долях миллисекунды и десятках КБ
+# шум машины больше любого tolerance
+NOISE_FLOORS = {'p95_ms': 5.0, 'peak_kb': 64.0}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Сравнение с baseline -> (регрессии, отклонения). Регрессия — рост числа
+    запросов: оно детерминировано, и гейт падает только на нём. Латентность
+    и память зависят от машины, поэтому их рост сверх tolerance (но не
+    меньше NOISE_FLOORS сверх baseline) только отчитывается.
+    """
+    regressions, drift = [], []
+    for size, endpoints in results.items():
+        for endpoint, metrics in endpoints.items():
+            base = baseline.get(size, {}).get(endpoint)
+            if base is None:
+                continue
+            if metrics['queries'] > base['queries']:
+                regressions.append(f"{size} {endpoint}: запросов {metrics['queries']} > {base['queries']}")
+            for key, floor in NOISE_FLOORS.items():
+                limit = max(base[key] * tolerance, base[key] + floor)
+                if metrics[key] > limit:
+                    drift.append(f"{size} {endpoint}: {key} {metrics[key]} > {round(limit, 3)} (baseline {base[key]})")
+    return regressions, drift
+
+
+# Настройки SQLite «как было»: журнал отката, BEGIN DEFERRED, новое
+# соединение на каждый запрос. WAL хранится в самом файле базы, поэтому
+# режим журнала для сравнения задаётся явно.
+SQLITE_DEFAULTS = {'OPTIONS': {'init_command': 'PRAGMA journal_mode=DELETE'}, 'CONN_MAX_AGE': 0}
+
+
+def write_load(threads, per_thread, db_settings=None):
+    """
+    Параллельная нагрузка правками: threads потоков по per_thread запросов
+    (update_shift, increment_swap и чтение графика вперемешку), у каждого
+    потока своё соединение. db_settings временно подменяют OPTIONS и
+    CONN_MAX_AGE базы default. Возвращает пропускную способность и ошибки.
+    """
+    db = connections.settings['default']
+    saved = {key: db.get(key) for key in ('OPTIONS', 'CONN_MAX_AGE')}
+    db.update(db_settings or {})
+    connections['default'].close()
+
+    cafes = list(Worker.objects.values_list('coffee_shop_id', flat=True).distinct())
+    worker_ids = list(Worker.objects.values_list('id', flat=True))
+    first_day = date.today().replace(day=1)
+    barrier = threading.Barrier(threads)
+    lock = threading.Lock()
+    totals = {'writes': 0, 'reads': 0, 'locked': 0, 'errors': 0}
+
+    def run(n):
+        rng = random.Random(n)
+        client = Client()
+        done = {'writes': 0, 'reads': 0, 'locked': 0, 'errors': 0}
+        barrier.wait()
+        try:
+            for i in range(per_thread):
+                roll = rng.random()
+                if roll < 0.2:
+                    response = client.get(f'/api/schedule/{rng.choice(cafes)}/')
+                elif roll < 0.3:
+                    response = client.post('/api/swap/increment/', json.dumps({
+                        'worker_id': rng.choice(worker_ids),
+                    }), content_type='application/json')
+                else:
+                    response = client.post('/api/shift/update/', json.dumps({
+                        'worker_id': rng.choice(worker_ids),
+                        'date': (first_day + timedelta(days=rng.randrange(28))).isoformat(),
+                        'start_time': rng.choice(['07:30', '08:00', '10:00', None]),
+                    }), content_type='application/json')
+                if response.status_code < 400:
+                    done['reads' if roll < 0.2 else 'writes'] += 1
+                elif b'locked' in response.content:
+                    done['locked'] += 1
+                else:
+                    done['errors'] += 1
+        finally:
+            connections.close_all()
+            with lock:
+                for key, value in done.items():
+                    totals[key] += value
+
+    workers = [threading.Thread(target=run, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    db.update(saved)
+    connections['default'].close()
+    return {
+        **totals,
+        'seconds': round(elapsed, 3),
+        'writes_per_s': round(totals['writes'] / elapsed, 1),
+    }
@@ -0,0 +1,183 @@
+# main/bulk.py
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from .cache import bump_schedule_version
+from .conflicts import cell_conflict
+from .coverage import refresh_coverage
+from .journal import ChangeBuffer, shift_state
+from .models import CoffeeShop, Shift, Worker
+from .pubsub import publish_schedule_event
+from .schedule import archive_horizon, cell_value, day_states
+from .staffing import check_and_notify_understaffed_days
+
+MAX_CELLS = 10000
+MAX_RANGE_DAYS = 366
+SHIFT_FIELDS = ('coffee_shop', 'start_time', 'other_coffee_shop', 'display_value')
+SHIFT_TIME_VALUES = {value for value, _ in Shift.SHIFT_TIMES}
+
+
+def _state(shift):
+    return (shift.coffee_shop_id, shift.start_time, shift.other_coffee_shop_id, shift.display_value)
+
+
+def _bump(cafe_id, months):
+    for month in months:
+        bump_schedule_version(cafe_id, month)
+
+
+def expand_edit(edit):
+    """
+    Разворачивает одну правку в список дат.
+
+    Правка — либо одна ячейка ({"worker_id", "date", ...}), либо диапазон
+    ({"worker_id", "from", "to", "weekdays": [0..6], ...}); weekdays
+    необязателен, 0 — понедельник.
+    """
+    if 'date' in edit:
+        return [date.fromisoformat(edit['date'])]
+
+    start = date.fromisoformat(edit['from'])
+    end = date.fromisoformat(edit['to'])
+    if end < start:
+        raise ValueError(f"Пустой диапазон {start} – {end}")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"Диапазон длиннее {MAX_RANGE_DAYS} дней")
+    weekdays = set(edit.get('weekdays', range(7)))
+    return [
+        start + timedelta(days=i)
+        for i in range((end - start).days + 1)
+        if (start + timedelta(days=i)).weekday() in weekdays
+    ]
+
+
+def apply_edits(edits, max_cells=MAX_CELLS, source='api', actor=''):
+    """
+    Применяет набор правок графика одной транзакцией.
+
+    Работники, точки подработки и текущие смены читаются по одному запросу
+    в той же транзакции, что и запись; запись идёт upsert'ом через bulk_create(update_conflicts=True), а
+    DailyCoverage пересчитывается в той же транзакции для затронутых
+    (точка, дата) — и своей точки, и точки подработки; это же покрытие
+    идёт в outbox и в ответ, без повторного чтения. Если правка
+    повторяет ячейку, побеждает последняя. Конфликтная ячейка (см.
+    conflicts.cell_conflict) отклоняет весь набор. max_cells ограничивает размер
+    одного вызова. Каждая изменившаяся ячейка попадает в журнал ShiftChange
+    с пометкой source/actor — той же транзакцией, одним bulk_create.
+
+    Возвращает (изменившиеся ячейки, пересчитанный недобор по затронутым дням).
+    """
+    cells = {}
+    for edit in edits:
+        other_cafe_id = edit.get('other_cafe_id')
+        values = (
+            edit.get('start_time'),
+            int(other_cafe_id) if other_cafe_id else None,
+            edit.get('display_value'),
+        )
+        if values[0] is not None and values[0] not in SHIFT_TIME_VALUES:
+            raise ValueError(f"Неизвестное время смены {values[0]}")
+        worker_id = int(edit['worker_id'])
+        for d in expand_edit(edit):
+            cells[(worker_id, d)] = values
+    if len(cells) > max_cells:
+        raise ValueError(f"Слишком много ячеек: {len(cells)} > {max_cells}")
+    if not cells:
+        return [], []
+
+    horizon = archive_horizon()
+    if horizon and min(d for _, d in cells) < horizon:
+        # закрытые месяцы лежат в архиве и свёрнуты в итоги — править их нельзя
+        raise ValueError(f"Месяцы раньше {horizon:%Y-%m} закрыты")
+
+    # чтение и запись — одна транзакция: в режиме IMMEDIATE она с первого
+    # запроса держит блокировку записи, так что снимок existing (а с ним
+    # пропуски «без изменений» и old_value журнала) не устареет до upsert'а
+    with transaction.atomic():
+        workers = Worker.objects.select_related('coffee_shop').in_bulk({w for w, _ in cells})
+        other_cafes = CoffeeShop.objects.in_bulk({v[1] for v in cells.values() if v[1]})
+        for worker_id, _ in cells:
+            if worker_id not in workers:
+                raise Worker.DoesNotExist(f"Работник {worker_id} не найден")
+        for (worker_id, _), (start_time, other_cafe_id, _) in cells.items():
+            if other_cafe_id and other_cafe_id not in other_cafes:
+                raise CoffeeShop.DoesNotExist(f"Точка {other_cafe_id} не найдена")
+            conflict = cell_conflict(workers[worker_id], start_time, other_cafe_id)
+            if conflict:
+                raise ValueError(conflict)
+
+        dates = [d for _, d in cells]
+        existing = {
+            (s.worker_id, s.date): s
+            for s in Shift.objects.filter(
+                worker_id__in=list(workers), date__gte=min(dates), date__lte=max(dates)
+            ).order_by()
+        }
+
+        changed = []
+        journal = ChangeBuffer(source, actor)
+        coverage_keys = set()
+        affected = {}
+        for (worker_id, d), (start_time, other_cafe_id, display_value) in cells.items():
+            worker = workers[worker_id]
+            shift = Shift(
+                worker=worker,
+                coffee_shop=worker.coffee_shop,
+                date=d,
+                start_time=start_time,
+                other_coffee_shop=other_cafes.get(other_cafe_id),
+                display_value=display_value,
+            )
+            old = existing.get((worker_id, d))
+            if old is None and start_time is None and other_cafe_id is None and display_value is None:
+                # выходной в пустой ячейке — писать нечего
+                continue
+            if old is not None and _state(old) == _state(shift):
+                continue
+            changed.append(shift)
+            journal.shift(worker_id, worker.coffee_shop_id, d, shift_state(old), shift_state(shift))
+
+            # покрытие меняется и у своей точки, и у точки, куда человека одолжили
+            keys = {shift.coverage_key(), old.coverage_key() if old else None} - {None}
+            coverage_keys |= keys
+            for cafe_id in {shift.coffee_shop_id} | {cafe_id for cafe_id, _ in keys}:
+                affected.setdefault(cafe_id, set()).add(d)
+
+        if not changed:
+            return [], []
+
+        cafes = CoffeeShop.objects.in_bulk(list(affected))
+        Shift.objects.bulk_create(
+            changed,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['worker', 'date'],
+            update_fields=[*SHIFT_FIELDS, 'updated_at'],
+        )
+        journal.flush()
+        # пересчитываем и затронутые дни своих точек: их покрытие нужно
+        # outbox'у и патчу сетки, а так оно приходит из того же запроса
+        counts = refresh_coverage(coverage_keys | {(c, d) for c, ds in affected.items() for d in ds})
+        day_counts = {
+            cafe_id: {d: counts[(cafe_id, d)] for d in cafe_dates} for cafe_id, cafe_dates in affected.items()
+        }
+        for cafe_id, cafe_dates in affected.items():
+            # уведомления о недоборе уходят в outbox вместе с правкой
+            check_and_notify_understaffed_days(cafes[cafe_id], cafe_dates, day_counts[cafe_id])
+            months = {date(d.year, d.month, 1) for d in cafe_dates}
+            transaction.on_commit(lambda cafe_id=cafe_id, months=months: _bump(cafe_id, months))
+
+    cells = []
+    days = []
+    for cafe_id, cafe_dates in affected.items():
+        cafe = cafes[cafe_id]
+        cafe_cells = [
+            {'worker_id': s.worker_id, 'date': s.date.isoformat(), 'value': cell_value(s)}
+            for s in changed if s.coffee_shop_id == cafe_id
+        ]
+        cafe_days = day_states(cafe, cafe_dates, day_counts[cafe_id])
+        publish_schedule_event(cafe_id, {'type': 'cells', 'cells': cafe_cells, 'days': cafe_days})
+        cells.extend(cafe_cells)
+        days.extend({'cafe_id': cafe_id, **state} for state in cafe_days)
+    return cells, days
@@ -0,0 +1,143 @@
+# main/cache.py
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .schedule import adjacent_months, build_schedule, months_between
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+COFFEE_SHOPS_VERSION_KEY = 'coffee_shops:version'
+
+
+def _cache():
+    return caches[getattr(settings, 'SCHEDULE_CACHE_ALIAS', 'default')]
+
+
+def _version_key(cafe_id, year, month):
+    return f"schedule:version:{cafe_id}:{year}-{month:02d}"
+
+
+def _workers_version_key(cafe_id):
+    return f"schedule:workers:{cafe_id}"
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def _current_version(key):
+    """
+    Текущая версия по ключу.
+
+    Версия стартует со времени в наносекундах, а не с 1: если ключ версии
+    вытеснят из кеша, новая версия всё равно окажется больше старой, и
+    устаревший payload под старым ключом не отдастся.
+    """
+    cache = _cache()
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def _bump_version(key):
+    cache = _cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def schedule_version(cafe_id, year, month):
+    """Текущая версия графика кофейни за месяц."""
+    return _current_version(_version_key(cafe_id, year, month))
+
+
+def bump_schedule_version(cafe_id, d):
+    """Инвалидирует закешированный график кофейни за месяц, в который попадает d."""
+    return _bump_version(_version_key(cafe_id, d.year, d.month))
+
+
+def workers_version(cafe_id):
+    """Версия состава работников точки — строки графика во всех её месяцах."""
+    return _current_version(_workers_version_key(cafe_id))
+
+
+def bump_workers_version(cafe_id):
+    return _bump_version(_workers_version_key(cafe_id))
+
+
+def coffee_shops_version():
+    return _current_version(COFFEE_SHOPS_VERSION_KEY)
+
+
+def bump_coffee_shops_version():
+    return _bump_version(COFFEE_SHOPS_VERSION_KEY)
+
+
+def schedule_token(cafe_id, year, month):
+    """
+    Дешёвый маркер изменений графика: версия месяца, версия работников
+    точки (они — строки графика в любом месяце) и версия списка точек
+    (название и minimum_workers кофейни тоже попадают в payload).
+    """
+    return (
+        f"{cafe_id}-{year}-{month:02d}-"
+        f"{schedule_version(cafe_id, year, month)}-{workers_version(cafe_id)}-{coffee_shops_version()}"
+    )
+
+
+def range_token(cafe_id, start, end):
+    """Маркер изменений для диапазона дат — из маркеров всех задетых месяцев."""
+    tokens = '|'.join(schedule_token(cafe_id, year, month) for year, month in months_between(start, end))
+    return hashlib.sha1(f"{start}:{end}:{tokens}".encode()).hexdigest()
+
+
+def get_schedule(cafe_id, year, month, load_cafe):
+    """
+    Возвращает (payload, hit) для графика кофейни за месяц.
+
+    При попадании в кеш база не трогается вообще — даже кофейня не читается.
+    load_cafe(cafe_id) вызывается только при промахе.
+    """
+    cache = _cache()
+    key = f"schedule:data:{schedule_token(cafe_id, year, month)}"
+    payload = cache.get(key)
+    if payload is not None:
+        _count('hits')
+        return payload, True
+
+    _count('misses')
+    payload = build_schedule(load_cafe(cafe_id), year, month)
+    cache.set(key, payload, timeout=getattr(settings, 'SCHEDULE_CACHE_TIMEOUT', 300))
+    return payload, False
+
+
+def prefetch_adjacent(cafe_id, year, month, load_cafe):
+    """
+    Прогревает кеш соседних месяцев, чтобы переключение месяцев в интерфейсе
+    попадало в готовый payload. Уже закешированные месяцы не пересобираются.
+    """
+    for adjacent_year, adjacent_month in adjacent_months(year, month):
+        get_schedule(cafe_id, adjacent_year, adjacent_month, load_cafe)
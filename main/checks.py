@@ -0,0 +1,17 @@
+# main/checks.py
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def schedule_cache_is_shared(app_configs, **kwargs):
+    """Версии графиков в кеше процесса — ETag'и расходятся между воркерами."""
+    alias = getattr(settings, 'SCHEDULE_CACHE_ALIAS', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    if backend.endswith('LocMemCache'):
+        return [Warning(
+            f'Кеш графиков {alias!r} — LocMemCache: версии графиков не общие для процессов',
+            hint='С несколькими воркерами укажите в CACHES общий бэкенд (Redis, Memcached).',
+            id='main.W001',
+        )]
+    return []
@@ -0,0 +1,80 @@
+# main/conflicts.py
+from django.db.models import Case, CharField, F, Q, Value, When
+
+from .models import Shift
+from .schedule import month_bounds
+
+# Занятость работника на день — это одна строка Shift: (worker, date)
+# уникальны, так что «две ячейки на один день» база не пропустит. Конфликт
+# возможен только внутри строки — смена у себя и подработка одновременно,
+# подработка на собственной точке или строка, оставшаяся за прежней точкой
+# работника после перевода.
+CONFLICT_RULES = [
+    ('double_booked', Q(start_time__isnull=False, other_coffee_shop__isnull=False)),
+    ('self_lent', Q(other_coffee_shop=F('coffee_shop'))),
+    ('wrong_cafe', ~Q(coffee_shop=F('worker__coffee_shop'))),
+]
+
+
+def cell_conflict(worker, start_time, other_cafe_id):
+    """Почему ячейку нельзя записать — или None. Без запросов к базе."""
+    if start_time and other_cafe_id:
+        return f"{worker.name}: смена {start_time} у себя и подработка в один день"
+    if other_cafe_id and other_cafe_id == worker.coffee_shop_id:
+        return f"{worker.name}: подработка на собственной точке"
+    return None
+
+
+def month_conflicts(year, month, cafe_id=None):
+    """Все конфликтные ячейки месяца по сети (или по точке) — один запрос."""
+    start, end = month_bounds(year, month)
+    kind = Case(
+        *[When(rule, then=Value(name)) for name, rule in CONFLICT_RULES],
+        output_field=CharField(),
+    )
+    shifts = (
+        Shift.objects
+        .filter(date__gte=start, date__lte=end)
+        .annotate(kind=kind)
+        .filter(kind__isnull=False)
+        .order_by('date', 'worker_id')
+    )
+    if cafe_id is not None:
+        shifts = shifts.filter(Q(coffee_shop_id=cafe_id) | Q(worker__coffee_shop_id=cafe_id))
+    return [
+        {
+            'kind': row['kind'],
+            'worker_id': row['worker_id'],
+            'worker': row['worker__name'],
+            'date': row['date'].isoformat(),
+            'cafe_id': row['coffee_shop_id'],
+            'home_cafe_id': row['worker__coffee_shop_id'],
+            'start_time': row['start_time'],
+            'other_cafe_id': row['other_coffee_shop_id'],
+        }
+        for row in shifts.values(
+            'kind', 'worker_id', 'worker__name', 'date', 'coffee_shop_id',
+            'worker__coffee_shop_id', 'start_time', 'other_coffee_shop_id',
+        )
+    ]
+
+
+def borrowed_on(d):
+    """Кто на день d одолжен и куда — один запрос."""
+    return [
+        {
+            'worker_id': row['worker_id'],
+            'worker': row['worker__name'],
+            'from_cafe_id': row['coffee_shop_id'],
+            'from': row['coffee_shop__short_code'],
+            'to_cafe_id': row['other_coffee_shop_id'],
+            'to': row['other_coffee_shop__short_code'],
+        }
+        for row in Shift.objects
+        .filter(date=d, other_coffee_shop__isnull=False)
+        .order_by('other_coffee_shop_id', 'worker_id')
+        .values(
+            'worker_id', 'worker__name', 'coffee_shop_id', 'coffee_shop__short_code',
+            'other_coffee_shop_id', 'other_coffee_shop__short_code',
+        )
+    ]
@@ -0,0 +1,142 @@
+# main/coverage.py
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Q, When
+
+from .models import CoffeeShop, DailyCoverage, Shift
+
+
+def staffed_shifts(model=Shift):
+    """
+    Смены, которые кого-то закрывают, с аннотацией staffed_cafe — какую
+    точку. model — Shift или ShiftArchive, поля у них одинаковые.
+    """
+    return (
+        model.objects
+        .filter(Q(start_time__isnull=False) | Q(other_coffee_shop__isnull=False))
+        .annotate(staffed_cafe=Case(
+            When(other_coffee_shop__isnull=False, then=F('other_coffee_shop')),
+            default=F('coffee_shop'),
+        ))
+        .order_by()
+    )
+
+
+def adjust_coverage(key, delta):
+    """Сдвигает счётчик покрытия (точка, дата) на delta без пересчёта смен."""
+    if key is None or delta == 0:
+        return
+    cafe_id, d = key
+    rows = DailyCoverage.objects.filter(cafe_id=cafe_id, date=d)
+    if rows.update(staffed_count=F('staffed_count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            DailyCoverage.objects.create(cafe_id=cafe_id, date=d, staffed_count=max(delta, 0))
+    except IntegrityError:
+        # строку успел создать параллельный запрос
+        rows.update(staffed_count=F('staffed_count') + delta)
+
+
+def track_shift_save(shift):
+    old, new = shift._coverage_origin, shift.coverage_key()
+    if old != new:
+        adjust_coverage(old, -1)
+        adjust_coverage(new, 1)
+    shift._coverage_origin = new
+
+
+def track_shift_delete(shift):
+    adjust_coverage(shift._coverage_origin, -1)
+    shift._coverage_origin = None
+
+
+def refresh_coverage(keys):
+    """
+    Точно пересчитывает покрытие для набора (точка, дата) — для массовых
+    путей записи, где сигналы post_save не срабатывают. Один агрегирующий
+    запрос плюс один upsert. Возвращает {(точка, дата): покрытие}, чтобы
+    вызывающему не читать DailyCoverage заново.
+    """
+    keys = {k for k in keys if k is not None}
+    if not keys:
+        return {}
+    cafe_ids = {cafe_id for cafe_id, _ in keys}
+    dates = {d for _, d in keys}
+    counts = {
+        (row['staffed_cafe'], row['date']): row['n']
+        for row in staffed_shifts()
+        .filter(date__in=dates)
+        .filter(Q(coffee_shop__in=cafe_ids) | Q(other_coffee_shop__in=cafe_ids))
+        .values('staffed_cafe', 'date')
+        .annotate(n=Count('id'))
+    }
+    DailyCoverage.objects.bulk_create(
+        [DailyCoverage(cafe_id=cafe_id, date=d, staffed_count=counts.get((cafe_id, d), 0)) for cafe_id, d in keys],
+        update_conflicts=True,
+        unique_fields=['cafe', 'date'],
+        update_fields=['staffed_count'],
+    )
+    return {key: counts.get(key, 0) for key in keys}
+
+
+@transaction.atomic
+def rebuild_coverage():
+    """
+    Строит DailyCoverage с нуля по сменам в Shift. Возвращает число строк.
+
+    Закрытые месяцы (до archive_horizon) не трогаются: их смены уже в
+    ShiftArchive, а покрытие заморожено при архивации.
+    """
+    from .schedule import archive_horizon  # schedule сам импортирует coverage
+
+    horizon = archive_horizon()
+    coverage = DailyCoverage.objects.all()
+    shifts = staffed_shifts()
+    if horizon is not None:
+        coverage = coverage.filter(date__gte=horizon)
+        shifts = shifts.filter(date__gte=horizon)
+    coverage.delete()
+    rows = [
+        DailyCoverage(cafe_id=row['staffed_cafe'], date=row['date'], staffed_count=row['n'])
+        for row in shifts.values('staffed_cafe', 'date').annotate(n=Count('id'))
+    ]
+    DailyCoverage.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def coverage_counts(cafe, start, end):
+    """{дата: сколько человек закрывают точку} за диапазон — одно чтение по индексу (cafe, date)."""
+    return dict(
+        DailyCoverage.objects
+        .filter(cafe=cafe, date__gte=start, date__lte=end)
+        .values_list('date', 'staffed_count')
+    )
+
+
+def network_coverage(start, end):
+    """
+    Покрытие всех точек сети за диапазон: список точек и одно чтение
+    DailyCoverage по всем точкам сразу — два запроса на любое число точек.
+    Одолженные работники уже засчитаны точке, куда их одолжили.
+    """
+    days = (end - start).days + 1
+    staffed = {}
+    for cafe_id, d, count in (
+        DailyCoverage.objects
+        .filter(date__gte=start, date__lte=end)
+        .values_list('cafe_id', 'date', 'staffed_count')
+    ):
+        staffed.setdefault(cafe_id, [0] * days)[(d - start).days] = count
+
+    shops = []
+    for shop in CoffeeShop.objects.order_by('id'):
+        counts = staffed.get(shop.id, [0] * days)
+        shops.append({
+            'id': shop.id,
+            'name': shop.name,
+            'short_code': shop.short_code,
+            'minimum_workers': shop.minimum_workers,
+            'staffed': counts,
+            'red_days': [i + 1 for i, n in enumerate(counts) if n < shop.minimum_workers],
+        })
+    return shops
@@ -0,0 +1,212 @@
+# main/export.py
+import csv
+import zipfile
+from datetime import date
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+
+from .models import Shift, ShiftArchive, Worker
+from .payroll import payroll_rows
+from .schedule import archive_horizon, cell_value, months_between
+
+EXPORT_CHUNK_SIZE = 2000
+# столько кусков потока забирается за один переход в sync-поток под ASGI
+EXPORT_ASYNC_BATCH = 200
+
+PAYROLL_COLUMNS = [
+    ('month', 'Месяц'),
+    ('worker', 'Работник'),
+    ('cafe', 'Точка'),
+    ('shifts', 'Смен'),
+    ('hours', 'Часов'),
+    ('rate', 'Ставка'),
+    ('pay', 'К выплате'),
+]
+
+
+def _shift_cursor(model, start, end, cafe_id):
+    shifts = (
+        model.objects
+        .filter(date__gte=start, date__lte=end)
+        .select_related('other_coffee_shop')
+        .order_by('worker__coffee_shop_id', 'worker_id', 'date')
+    )
+    if cafe_id is not None:
+        shifts = shifts.filter(worker__coffee_shop_id=cafe_id)
+    return shifts.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def schedule_rows(start, end, cafe_id=None):
+    """
+    Строки выгрузки графика: заголовок, затем по строке на (работник, месяц)
+    с днями 1..31, как в сетке schedule.html.
+
+    Работники и смены идут курсорами .iterator() в одном порядке
+    (точка, работник) и сливаются на лету — в памяти только смены одного
+    работника, сколько бы точек и месяцев ни выгружалось. Месяцы за
+    горизонтом архивации читаются ещё и из ShiftArchive, как в сетке.
+    """
+    yield ['Точка', 'Работник', 'Месяц'] + list(range(1, 32))
+
+    workers = Worker.objects.select_related('coffee_shop').order_by('coffee_shop_id', 'id')
+    if cafe_id is not None:
+        workers = workers.filter(coffee_shop_id=cafe_id)
+    # архивные ячейки первыми: поправленная после архивации ячейка в Shift их перекроет
+    cursors = [_shift_cursor(Shift, start, end, cafe_id)]
+    horizon = archive_horizon()
+    if horizon and start < horizon:
+        cursors.insert(0, _shift_cursor(ShiftArchive, start, end, cafe_id))
+
+    months = list(months_between(start, end))
+    pending = [next(shifts, None) for shifts in cursors]
+    for worker in workers.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        cells = {}
+        for i, shifts in enumerate(cursors):
+            while pending[i] is not None and pending[i].worker_id == worker.id:
+                cells[pending[i].date] = cell_value(pending[i])
+                pending[i] = next(shifts, None)
+        for year, month in months:
+            row = [worker.coffee_shop.name, worker.name, f"{year}-{month:02d}"]
+            for day in range(1, 32):
+                try:
+                    d = date(year, month, day)
+                except ValueError:
+                    d = None
+                row.append(cells.get(d, '') if d and start <= d <= end else '')
+            yield row
+
+
+def payroll_export_rows(start, end, cafe_id=None):
+    """Строки выгрузки часов: payroll_rows уже агрегирован в базе."""
+    yield [title for _, title in PAYROLL_COLUMNS]
+    for row in payroll_rows(start, end, cafe_id):
+        yield [row[key] for key, _ in PAYROLL_COLUMNS]
+
+
+class _Echo:
+    """Файлоподобный объект, который просто отдаёт записанное обратно."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows):
+    # BOM — чтобы Excel открыл UTF-8 с кириллицей без мастера импорта
+    yield '\ufeff'
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+class _Sink:
+    """Поток без seek для zipfile: копит записанное до очередного drain()."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def _column(index):
+    letters = ''
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return letters
+
+
+def _xlsx_cell(ref, value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    if value in ('', None):
+        return ''
+    return f'<c r="{ref}" t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+
+def xlsx_stream(rows, sheet_name, flush_every=500):
+    """
+    Минимальный .xlsx (один лист, строки inlineStr) потоком: zipfile пишет
+    в поток без seek, а накопленные байты отдаются каждые flush_every строк.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', WORKBOOK.format(name=escape(sheet_name[:31])))
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for number, row in enumerate(rows, start=1):
+                cells = ''.join(_xlsx_cell(f'{_column(i)}{number}', value) for i, value in enumerate(row))
+                sheet.write(f'<row r="{number}">{cells}</row>'.encode())
+                if number % flush_every == 0:
+                    yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+async def async_stream(stream, batch=EXPORT_ASYNC_BATCH):
+    """
+    Синхронный поток выгрузки как async-итератор — для ASGI, где
+    StreamingHttpResponse с обычным генератором вычитывается в память
+    целиком. Куски забираются пачками в sync-потоке (курсоры базы живут
+    там же), так что в памяти держится одна пачка.
+    """
+    take = sync_to_async(lambda: list(islice(stream, batch)), thread_sensitive=True)
+    while chunk := await take():
+        yield chunk[0][:0].join(chunk)
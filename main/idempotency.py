@@ -0,0 +1,78 @@
+# main/idempotency.py
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def idempotency_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_TTL', 7 * 24 * 3600))
+
+
+def idempotent(view):
+    """
+    Делает POST-view идемпотентным по заголовку Idempotency-Key.
+
+    Ключ записывается в той же транзакции, что и сама правка: либо
+    закоммичены оба, либо ни один. Повтор с тем же ключом (например, очередь
+    офлайн-правок переотправила запрос, ответ на который потерялся) получает
+    сохранённый ответ и ничего не меняет. Сохраняются только ответы 2xx:
+    после 4xx/5xx ключ освобождается, и исправленный запрос с ним же
+    выполнится. Без заголовка view работает как раньше.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or request.method != 'POST':
+            return view(request, *args, **kwargs)
+        if len(key) > 64:
+            return JsonResponse({'error': f'{HEADER} длиннее 64 символов'}, status=400)
+
+        stored = IdempotencyKey.objects.filter(key=key, created_at__gte=timezone.now() - idempotency_ttl()).first()
+        if stored is not None:
+            return _replay(stored, request)
+
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.filter(key=key).delete()  # просроченный
+                record = IdempotencyKey.objects.create(key=key, path=request.path, status=0, response='')
+                response = view(request, *args, **kwargs)
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                    return response
+                if not 200 <= response.status_code < 300:
+                    record.delete()
+                    return response
+                record.status = response.status_code
+                record.response = response.content.decode()
+                record.save(update_fields=['status', 'response'])
+                return response
+        except IntegrityError:
+            # тот же ключ параллельно обрабатывает другой запрос — он и победил
+            stored = IdempotencyKey.objects.filter(key=key).first()
+            if stored is None:
+                return JsonResponse({'error': 'Запрос с этим ключом ещё выполняется'}, status=409)
+            return _replay(stored, request)
+
+    return wrapper
+
+
+def _replay(stored, request):
+    if stored.path != request.path:
+        return JsonResponse({'error': f'{HEADER} уже использован для {stored.path}'}, status=422)
+    response = HttpResponse(stored.response, status=stored.status, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def prune_idempotency_keys():
+    """Удаляет ключи старше IDEMPOTENCY_TTL. Возвращает число удалённых."""
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - idempotency_ttl()).delete()
+    return deleted
@@ -0,0 +1,125 @@
+# main/importer.py
+import csv
+from datetime import date
+
+from .bulk import SHIFT_TIME_VALUES, apply_edits
+from .conflicts import cell_conflict
+from .models import CoffeeShop, Worker
+from .schedule import archive_horizon
+
+IMPORT_MAX_CELLS = 50000
+COLUMNS = {
+    'worker': 'worker', 'работник': 'worker',
+    'date': 'date', 'дата': 'date',
+    'value': 'value', 'значение': 'value',
+}
+
+
+def parse_value(value, shops):
+    """
+    Ячейка в нотации сетки -> (start_time, other_cafe_id, display_value).
+    shops — {short_code: id}. Голый код точки — подработка, как её ставит
+    schedule.html (код в display_value), «+ код» — подработка без него.
+    """
+    value = value.strip()
+    if not value:
+        return None, None, None
+    if value in SHIFT_TIME_VALUES:
+        return value, None, None
+    if value == '+':
+        return None, None, '+'
+    if value.startswith('+'):
+        code = value[1:].strip()
+        if code not in shops:
+            raise ValueError(f"Неизвестная точка {code}")
+        return None, shops[code], None
+    if value in shops:
+        return None, shops[value], value
+    raise ValueError(f"Непонятное значение ячейки {value!r}")
+
+
+def read_rows(lines):
+    """Строки CSV (worker, date, value) -> [(номер строки, {колонка: значение})]."""
+    lines = iter(lines)
+    header = next(lines, '').lstrip('\ufeff')
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    names = [COLUMNS.get(name.strip().lower()) for name in next(csv.reader([header], delimiter=delimiter))]
+    if not {'worker', 'date', 'value'} <= set(names):
+        raise ValueError('Нужны колонки worker, date, value')
+    rows = []
+    for number, row in enumerate(csv.reader(lines, delimiter=delimiter), start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        rows.append((number, {name: cell for name, cell in zip(names, row) if name}))
+    return rows
+
+
+def validate_import(rows, cafe):
+    """
+    Проверяет строки импорта для точки cafe и превращает их в правки apply_edits.
+
+    Работник — id или точное имя. Ошибки: неизвестный работник или точка
+    подработки, работник чужой точки, повтор одной ячейки (worker, date),
+    неверная дата или значение, закрытый месяц и конфликт ячейки
+    (conflicts.cell_conflict) — всё, на чём apply_edits отклонил бы весь
+    набор. Возвращает (правки, [{line, error}]).
+    """
+    keys = {row.get('worker', '').strip() for _, row in rows}
+    ids = {int(key) for key in keys if key.isdigit()}
+    workers = list(Worker.objects.filter(id__in=ids).only('id', 'name', 'coffee_shop_id'))
+    workers += Worker.objects.filter(name__in=keys - {str(i) for i in ids}).only('id', 'name', 'coffee_shop_id')
+    by_id = {w.id: w for w in workers}
+    by_name = {}
+    for w in workers:
+        by_name.setdefault(w.name, []).append(w)
+    shops = dict(CoffeeShop.objects.values_list('short_code', 'id'))
+    horizon = archive_horizon()
+
+    edits, errors, seen = [], [], {}
+    for number, row in rows:
+        try:
+            key = row.get('worker', '').strip()
+            if key.isdigit():
+                worker = by_id.get(int(key))
+            else:
+                # однофамильцы: берём работника своей точки
+                matches = by_name.get(key, [])
+                worker = next((w for w in matches if w.coffee_shop_id == cafe.id), matches[0] if matches else None)
+            if worker is None:
+                raise ValueError(f"Неизвестный работник {key}")
+            if worker.coffee_shop_id != cafe.id:
+                raise ValueError(f"{worker.name} работает на другой точке")
+            d = date.fromisoformat(row.get('date', '').strip())
+            if horizon and d < horizon:
+                raise ValueError(f"Месяцы раньше {horizon:%Y-%m} закрыты")
+            if (worker.id, d) in seen:
+                raise ValueError(f"Ячейка {worker.name} {d} уже была в строке {seen[worker.id, d]}")
+            start_time, other_cafe_id, display_value = parse_value(row.get('value', ''), shops)
+            conflict = cell_conflict(worker, start_time, other_cafe_id)
+            if conflict:
+                raise ValueError(conflict)
+        except ValueError as e:
+            errors.append({'line': number, 'error': str(e)})
+            continue
+        seen[worker.id, d] = number
+        edits.append({
+            'worker_id': worker.id,
+            'date': d.isoformat(),
+            'start_time': start_time,
+            'other_cafe_id': other_cafe_id,
+            'display_value': display_value,
+        })
+    return edits, errors
+
+
+def import_schedule(lines, cafe, dry_run=False, actor=''):
+    """
+    Импорт CSV ячеек графика точки. Корректные строки применяются одним
+    вызовом apply_edits — одна транзакция, upsert пачками; ошибочные
+    возвращаются с номерами строк.
+    """
+    edits, errors = validate_import(read_rows(lines), cafe)
+    changed = []
+    if edits and not dry_run:
+        changed, _ = apply_edits(edits, max_cells=IMPORT_MAX_CELLS, source='import', actor=actor)
+    return {'cells': len(edits), 'changed': len(changed), 'errors': errors}
@@ -0,0 +1,117 @@
+# main/journal.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .models import ShiftChange
+
+JOURNAL_BATCH = 1000
+HISTORY_PAGE = 500
+
+# кто правит, если запись журнала пишет сигнал, а не вызывающий код
+_context = ContextVar('journal_context', default=('orm', ''))
+
+
+def shift_state(shift):
+    """Состояние ячейки для журнала; None — ячейки нет."""
+    if shift is None:
+        return None
+    return {
+        'start_time': shift.start_time,
+        'other_cafe_id': shift.other_coffee_shop_id,
+        'display_value': shift.display_value,
+    }
+
+
+def actor_of(request):
+    """Кто правит: имя пользователя, если он вошёл, иначе пусто."""
+    user = getattr(request, 'user', None)
+    return user.get_username() if user is not None and user.is_authenticated else ''
+
+
+@contextmanager
+def journal_context(source, actor=''):
+    """Помечает записи журнала, которые сигналы пишут внутри блока (удаления смен)."""
+    token = _context.set((source, actor))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ChangeBuffer:
+    """
+    Копит записи журнала одной операции и пишет их одним bulk_create.
+
+    flush() вызывают внутри транзакции самой правки: запись в журнале
+    появляется тогда и только тогда, когда закоммичена правка, а правка на
+    N ячеек стоит одного INSERT'а пачками, а не N.
+    """
+
+    def __init__(self, source, actor=''):
+        self.source = source
+        self.actor = actor
+        self.entries = []
+
+    @classmethod
+    def from_context(cls):
+        return cls(*_context.get())
+
+    def shift(self, worker_id, cafe_id, d, old, new):
+        self._add(ShiftChange.SHIFT, worker_id, cafe_id, d, old, new)
+
+    def swaps(self, worker_id, cafe_id, month, old, new):
+        self._add(ShiftChange.SWAPS, worker_id, cafe_id, month,
+                  None if old is None else {'swaps': old}, {'swaps': new})
+
+    def _add(self, kind, worker_id, cafe_id, d, old, new):
+        if old == new:
+            return
+        self.entries.append(ShiftChange(
+            kind=kind, worker_id=worker_id, cafe_id=cafe_id, date=d,
+            old_value=old, new_value=new, source=self.source, actor=self.actor,
+        ))
+
+    def flush(self):
+        if self.entries:
+            ShiftChange.objects.bulk_create(self.entries, batch_size=JOURNAL_BATCH)
+        written = len(self.entries)
+        self.entries = []
+        return written
+
+
+def change_history(worker_id=None, cafe_id=None, start=None, end=None, kind=None, after=0, limit=HISTORY_PAGE):
+    """
+    История правок работника и/или точки за диапазон дат ячеек в порядке
+    записи. Постранично по id: следующая страница — after=<next>.
+
+    Нужен работник или точка — по ним (и дате) идут индексы журнала,
+    так что запрос не растёт вместе с таблицей.
+    Возвращает (записи, next или None).
+    """
+    if worker_id is None and cafe_id is None:
+        raise ValueError('Нужен worker или cafe')
+    changes = ShiftChange.objects.filter(id__gt=after)
+    if worker_id is not None:
+        changes = changes.filter(worker_id=worker_id)
+    if cafe_id is not None:
+        changes = changes.filter(cafe_id=cafe_id)
+    if start is not None:
+        changes = changes.filter(date__gte=start)
+    if end is not None:
+        changes = changes.filter(date__lte=end)
+    if kind is not None:
+        changes = changes.filter(kind=kind)
+
+    entries = []
+    for row in changes.order_by('id').values(
+        'id', 'kind', 'worker_id', 'worker__name', 'cafe_id', 'date', 'old_value', 'new_value',
+        'source', 'actor', 'created_at',
+    )[:limit + 1]:
+        entries.append({
+            **row,
+            'date': row['date'].isoformat(),
+            'created_at': row['created_at'].isoformat(),
+        })
+    if len(entries) > limit:
+        return entries[:limit], entries[limit - 1]['id']
+    return entries, None
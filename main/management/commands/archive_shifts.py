@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.archive import archive_month, months_to_archive
+from main.schedule import archive_horizon
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит смены месяцев старше ARCHIVE_KEEP_MONTHS в ShiftArchive и '
+        'сворачивает их в итоги по работникам и точкам. Рассчитана на запуск '
+        'раз в сутки по cron; повторный запуск безопасен.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='только показать месяцы')
+
+    def handle(self, *args, **options):
+        horizon = archive_horizon()
+        if horizon is None:
+            raise CommandError('Архивация выключена: задайте ARCHIVE_KEEP_MONTHS в settings')
+
+        months = months_to_archive()
+        if not months:
+            self.stdout.write(f'До {horizon:%Y-%m} архивировать нечего')
+            return
+        for month in months:
+            if options['dry_run']:
+                self.stdout.write(f'{month:%Y-%m}')
+                continue
+            moved = archive_month(month.year, month.month)
+            self.stdout.write(f'{month:%Y-%m}: в архив {moved} смен')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'В Shift остались месяцы с {horizon:%Y-%m}'))
@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from main.benchmark import compare, run_size
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'bench_baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк API графика на синтетических данных: латентность (p50/p95/p99), '
+        'число SQL-запросов и пик памяти по эндпоинтам. Работает на отдельной '
+        'тестовой базе, рабочую не трогает.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', default=['1x10x1', '3x15x6', '5x30x12'],
+                            help='размеры ТОЧКИxРАБОТНИКИxМЕСЯЦЫ')
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--output', help='куда записать результаты в JSON')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--tolerance', type=float, default=2.0,
+                            help='во сколько раз латентность и память могут превысить baseline, прежде чем попасть в отчёт')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='перезаписать baseline текущими результатами')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = {}
+            for size in options['sizes']:
+                results[size] = run_size(size, options['repeat'])
+                for endpoint, metrics in results[size].items():
+                    self.stdout.write(
+                        f"{size:>10} {endpoint:<16} p50 {metrics['p50_ms']:>8.2f} ms  "
+                        f"p95 {metrics['p95_ms']:>8.2f} ms  queries {metrics['queries']:>3}  "
+                        f"peak {metrics['peak_kb']:>9.1f} KB"
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            baseline_path.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline обновлён: {baseline_path}'))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f'Нет baseline {baseline_path}, сравнивать не с чем'))
+            return
+
+        regressions, drift = compare(results, json.loads(baseline_path.read_text()), options['tolerance'])
+        if drift:
+            self.stdout.write(self.style.WARNING('Латентность/память выше baseline (гейт не роняет):\n' + '\n'.join(drift)))
+        if regressions:
+            raise CommandError('Регрессии производительности:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,44 @@
+import random
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from main.benchmark import SQLITE_DEFAULTS, write_load
+from main.seeding import seed_schedule
+
+
+class Command(BaseCommand):
+    help = (
+        'Параллельные правки графика: пропускная способность записи и ошибки '
+        '«database is locked» при настройках SQLite по умолчанию и при настройках '
+        'из settings (WAL, pragma, IMMEDIATE, постоянные соединения). Работает '
+        'на отдельной тестовой базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=100, help='запросов на поток')
+        parser.add_argument('--size', default='3x15x2', help='ТОЧКИxРАБОТНИКИxМЕСЯЦЫ для засева')
+
+    def handle(self, *args, **options):
+        cafes, workers, months = (int(part) for part in options['size'].split('x'))
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for mode, db_settings in (('defaults', SQLITE_DEFAULTS), ('tuned', None)):
+                call_command('flush', interactive=False, verbosity=0)
+                cache.clear()
+                seed_schedule(cafes, workers, months, rng=random.Random(0))
+                result = write_load(options['threads'], options['requests'], db_settings)
+                self.stdout.write(
+                    f"{mode:<9} {result['writes_per_s']:>8.1f} записей/с  "
+                    f"записей {result['writes']:>5}  чтений {result['reads']:>5}  "
+                    f"locked {result['locked']:>4}  прочих ошибок {result['errors']:>4}  "
+                    f"{result['seconds']:.2f} с"
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.notifications import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Рассылает накопленные уведомления о недоборе из outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='работать постоянно, а не один проход')
+        parser.add_argument('--interval', type=float, default=5, help='пауза между проходами, секунд')
+        parser.add_argument('--debounce', type=float, help='тишина перед отправкой, секунд (NOTIFICATION_DEBOUNCE)')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = drain_outbox(debounce=options['debounce'])
+            if sent or not options['loop']:
+                self.stdout.write(f'Отправлено уведомлений: {sent}')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
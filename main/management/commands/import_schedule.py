@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.importer import import_schedule
+from main.models import CoffeeShop
+
+
+class Command(BaseCommand):
+    help = 'Импортирует ячейки графика точки из CSV (worker, date, value)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV-файл; колонки worker, date, value')
+        parser.add_argument('--cafe', required=True, help='id или short_code точки')
+        parser.add_argument('--dry-run', action='store_true', help='только проверить, ничего не записывать')
+
+    def handle(self, *args, **options):
+        cafe_key = options['cafe']
+        lookup = {'id': int(cafe_key)} if cafe_key.isdigit() else {'short_code': cafe_key}
+        try:
+            cafe = CoffeeShop.objects.get(**lookup)
+        except CoffeeShop.DoesNotExist:
+            raise CommandError(f'Точка {cafe_key} не найдена')
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as f:
+            try:
+                result = import_schedule(f, cafe, dry_run=options['dry_run'])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(f"строка {error['line']}: {error['error']}")
+        verb = 'проверено' if options['dry_run'] else 'изменено'
+        self.stdout.write(self.style.SUCCESS(
+            f"{cafe.name}: ячеек {result['cells']}, {verb} {result['changed']}, ошибок {len(result['errors'])}"
+        ))
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.payroll import payroll_rows, payroll_totals
+from main.schedule import span_bounds
+
+
+class Command(BaseCommand):
+    help = 'Часы и оплата по работникам и точкам за месяц или диапазон дат'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='YYYY-MM (по умолчанию текущий месяц)')
+        parser.add_argument('--from', dest='from', help='первый день диапазона, YYYY-MM-DD')
+        parser.add_argument('--to', help='последний день диапазона, YYYY-MM-DD')
+        parser.add_argument('--cafe', type=int, help='только смены, отработанные на этой точке')
+        parser.add_argument('--json', action='store_true', help='вывести строки отчёта в JSON')
+
+    def handle(self, *args, **options):
+        params = {key: options[key] for key in ('month', 'from', 'to') if options[key]}
+        try:
+            start, end = span_bounds(params)
+        except (KeyError, ValueError) as e:
+            raise CommandError(f'Неверный период: {e}')
+
+        rows = payroll_rows(start, end, options['cafe'])
+        if options['json']:
+            self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
+            return
+
+        for row in rows:
+            self.stdout.write(
+                f"{row['month']}  {row['worker']:<30} {row['cafe']:<20} "
+                f"{row['shifts']:>3} смен {row['hours']:>7.1f} ч {row['pay']:>10.2f}"
+            )
+        by_worker, by_cafe = payroll_totals(rows)
+        self.stdout.write('')
+        for total in by_cafe:
+            self.stdout.write(f"{total['name']:<20} {total['hours']:>8.1f} ч {total['pay']:>12.2f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{start} – {end}: {sum(t['hours'] for t in by_cafe):.1f} ч, "
+            f"{sum(t['pay'] for t in by_cafe):.2f} к выплате"
+        ))
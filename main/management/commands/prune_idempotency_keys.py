@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from main.idempotency import prune_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Удаляет сохранённые ответы Idempotency-Key старше IDEMPOTENCY_TTL'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Удалено ключей: {prune_idempotency_keys()}')
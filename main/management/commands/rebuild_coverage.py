@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.coverage import rebuild_coverage
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает таблицу DailyCoverage с нуля по всем сменам'
+
+    def handle(self, *args, **options):
+        rows = rebuild_coverage()
+        self.stdout.write(self.style.SUCCESS(f'DailyCoverage: {rows} строк'))
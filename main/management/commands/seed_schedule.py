@@ -0,0 +1,29 @@
+import random
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from main.seeding import seed_schedule
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими точками, работниками, сменами и счётчиками обменов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cafes', type=int, default=3)
+        parser.add_argument('--workers', type=int, default=15, help='работников на точку')
+        parser.add_argument('--months', type=int, default=3)
+        parser.add_argument('--start', help='первый месяц, YYYY-MM (по умолчанию текущий)')
+        parser.add_argument('--prefix', default='S', help='префикс short_code новых точек')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        start = date.fromisoformat(options['start'] + '-01') if options['start'] else None
+        shops = seed_schedule(
+            options['cafes'], options['workers'], options['months'],
+            start=start, prefix=options['prefix'], rng=random.Random(options['seed']),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано точек: {len(shops)}, работников: {options['cafes'] * options['workers']}, "
+            f"месяцев: {options['months']}"
+        ))
@@ -0,0 +1,134 @@
+# main/middleware.py
+import logging
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+_stats_lock = threading.Lock()
+_stats = {}
+# запросы мимо urlconf (404 на случайные пути) копятся под одним ключом,
+# иначе каждый новый путь навсегда заводил бы в _stats свою запись
+UNRESOLVED = '<unresolved>'
+
+
+def fingerprint(sql):
+    """Форма запроса: параметры уже вынесены в %s, списки IN схлопываем."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """execute_wrapper, который считает запросы, время в базе и повторы одной формы."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[fingerprint(sql)] += 1
+
+
+class ViewStats:
+    def __init__(self, window):
+        self.requests = 0
+        self.samples = deque(maxlen=window)
+        self.flagged = 0
+        self.duplicates = {}
+
+    def add(self, wall_ms, db_ms, queries, duplicates):
+        self.requests += 1
+        self.samples.append((wall_ms, db_ms, queries))
+        if duplicates:
+            self.flagged += 1
+            for shape, times in duplicates.items():
+                self.duplicates[shape] = max(times, self.duplicates.get(shape, 0))
+
+    def report(self):
+        walls = sorted(s[0] for s in self.samples)
+        return {
+            'requests': self.requests,
+            'wall_p50_ms': round(statistics.median(walls), 2),
+            'wall_p95_ms': round(walls[min(len(walls) - 1, int(len(walls) * 0.95))], 2),
+            'db_avg_ms': round(statistics.fmean(s[1] for s in self.samples), 2),
+            'queries_avg': round(statistics.fmean(s[2] for s in self.samples), 1),
+            'queries_max': max(s[2] for s in self.samples),
+            'flagged_requests': self.flagged,
+            'duplicate_queries': self.duplicates,
+        }
+
+
+def perf_report():
+    """Сводка по view, самые медленные (по p95) сверху."""
+    with _stats_lock:
+        report = {view: stats.report() for view, stats in _stats.items()}
+    return dict(sorted(report.items(), key=lambda item: -item[1]['wall_p95_ms']))
+
+
+def reset_perf_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает для запроса число SQL-запросов, время в базе, повторы одной
+    формы запроса и общее время. Отдаёт их в заголовке Server-Timing и
+    копит скользящую статистику по view (см. /api/perf/).
+
+    Включается добавлением в MIDDLEWARE. PERF_SAMPLE_RATE задаёт долю
+    инструментируемых запросов, PERF_DUPLICATE_THRESHOLD — сколько раз одна
+    форма запроса может повториться, прежде чем view попадёт под подозрение
+    в N+1, PERF_WINDOW — сколько последних запросов на view хранить.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PERF_SAMPLE_RATE', 1.0)
+        self.threshold = getattr(settings, 'PERF_DUPLICATE_THRESHOLD', 5)
+        self.window = getattr(settings, 'PERF_WINDOW', 500)
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - started) * 1000
+        db_ms = recorder.duration * 1000
+
+        duplicates = {shape: n for shape, n in recorder.shapes.items() if n > self.threshold}
+        match = request.resolver_match
+        view = match.view_name if match else UNRESOLVED
+        if duplicates:
+            logger.warning('%s: повторяющиеся запросы %s', match.view_name if match else request.path, duplicates)
+
+        with _stats_lock:
+            if view not in _stats:
+                _stats[view] = ViewStats(self.window)
+            _stats[view].add(wall_ms, db_ms, recorder.count, duplicates)
+
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries", total;dur={wall_ms:.1f}'
+        )
+        return response
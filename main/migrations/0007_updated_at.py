@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_shift_display_value'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shift',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='swapcounter',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
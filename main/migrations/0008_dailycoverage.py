@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_coverage(apps, schema_editor):
+    Shift = apps.get_model('main', 'Shift')
+    DailyCoverage = apps.get_model('main', 'DailyCoverage')
+
+    counts = {}
+    for coffee_shop_id, start_time, other_coffee_shop_id, d in Shift.objects.values_list(
+        'coffee_shop_id', 'start_time', 'other_coffee_shop_id', 'date'
+    ):
+        cafe_id = other_coffee_shop_id or (coffee_shop_id if start_time is not None else None)
+        if cafe_id is not None:
+            counts[(cafe_id, d)] = counts.get((cafe_id, d), 0) + 1
+
+    DailyCoverage.objects.bulk_create([
+        DailyCoverage(cafe_id=cafe_id, date=d, staffed_count=n)
+        for (cafe_id, d), n in counts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('staffed_count', models.IntegerField(default=0)),
+                ('cafe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coverage', to='main.coffeeshop')),
+            ],
+            options={
+                'unique_together': {('cafe', 'date')},
+            },
+        ),
+        migrations.RunPython(fill_coverage, migrations.RunPython.noop),
+    ]
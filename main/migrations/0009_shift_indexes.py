@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_dailycoverage'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='shift',
+            options={'ordering': ['date', 'worker_id']},
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['coffee_shop', 'date'], name='shift_cafe_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['other_coffee_shop', 'date'], name='shift_other_cafe_date_idx'),
+        ),
+    ]
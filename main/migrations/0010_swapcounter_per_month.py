@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_shift_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='swapcounter',
+            name='worker',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='swap_counters', to='main.worker'),
+        ),
+    ]
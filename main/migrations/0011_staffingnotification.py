@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_swapcounter_per_month'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffingNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('understaffed', models.BooleanField()),
+                ('staffed_count', models.IntegerField()),
+                ('minimum_workers', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('cafe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='main.coffeeshop')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['processed_at', 'id'], name='notification_pending_idx'), models.Index(fields=['cafe', 'date'], name='notification_cafe_date_idx')],
+            },
+        ),
+    ]
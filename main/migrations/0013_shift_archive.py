@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_shift_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CafeMonthSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('by_start_time', models.JSONField(default=dict)),
+                ('borrowed_days', models.IntegerField(default=0)),
+                ('lent_days', models.IntegerField(default=0)),
+                ('understaffed_days', models.IntegerField(default=0)),
+                ('swaps', models.IntegerField(default=0)),
+                ('cafe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='month_summaries', to='main.coffeeshop')),
+            ],
+            options={
+                'unique_together': {('cafe', 'month')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ShiftArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.CharField(blank=True, choices=[('07:30', '7:30–22:00'), ('08:00', '8:00–22:00'), ('10:00', '10:00–22:00')], max_length=5, null=True)),
+                ('display_value', models.CharField(blank=True, max_length=10, null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+                ('coffee_shop', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='main.coffeeshop')),
+                ('other_coffee_shop', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.coffeeshop')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_shifts', to='main.worker')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['coffee_shop', 'date'], name='archive_cafe_date_idx')],
+                'unique_together': {('worker', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkerMonthSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('by_start_time', models.JSONField(default=dict)),
+                ('lent', models.JSONField(default=dict)),
+                ('plus_days', models.IntegerField(default=0)),
+                ('hours', models.FloatField(default=0)),
+                ('swaps', models.IntegerField(default=0)),
+                ('cafe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.coffeeshop')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='month_summaries', to='main.worker')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month'], name='worker_summary_month_idx')],
+                'unique_together': {('worker', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShiftChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('shift', 'Смена'), ('swaps', 'Обмены')], max_length=5)),
+                ('date', models.DateField()),
+                ('old_value', models.JSONField(null=True)),
+                ('new_value', models.JSONField(null=True)),
+                ('source', models.CharField(max_length=20)),
+                ('actor', models.CharField(blank=True, max_length=150)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cafe', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='main.coffeeshop')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='changes', to='main.worker')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['worker', 'date'], name='change_worker_date_idx'), models.Index(fields=['cafe', 'date'], name='change_cafe_date_idx')],
+            },
+        ),
+    ]
@@ -26,6 +26,7 @@ class Shift(models.Model):
         ('08:00', '8:00–22:00'),
         ('10:00', '10:00–22:00'),
     ]
+    SHIFT_END = '22:00'
 
     worker = models.ForeignKey(Worker, on_delete=models.PROTECT, related_name='shifts')
     coffee_shop = models.ForeignKey(CoffeeShop, on_delete=models.PROTECT)
@@ -33,10 +34,69 @@ class Shift(models.Model):
     start_time = models.CharField(max_length=5, choices=SHIFT_TIMES, blank=True, null=True)
     other_coffee_shop = models.ForeignKey(CoffeeShop, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     display_value = models.CharField(max_length=10, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('worker', 'date')
-        ordering = ['date', 'worker__name']
+        # сортировка по worker__name тянула JOIN с работниками в каждый запрос
+        ordering = ['date', 'worker_id']
+        # (worker, date) уже покрыт индексом unique_together
+        indexes = [
+            models.Index(fields=['coffee_shop', 'date'], name='shift_cafe_date_idx'),
+            models.Index(fields=['other_coffee_shop', 'date'], name='shift_other_cafe_date_idx'),
+            # date_hierarchy и сортировка списка смен в админке
+            models.Index(fields=['date'], name='shift_date_idx'),
+        ]
+
+    COVERAGE_FIELDS = frozenset({'date', 'start_time', 'coffee_shop_id', 'other_coffee_shop_id'})
+
+    # (точка, дата), которую смена закрывала на момент чтения из базы;
+    # по ней сигналы поддерживают DailyCoverage инкрементально
+    _coverage_origin = None
+    # графики (точка, месяц), где смена была видна на момент чтения, —
+    # их кеш сигналы сбрасывают вместе с новыми
+    _schedule_origin = frozenset()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if cls.COVERAGE_FIELDS.issubset(field_names):
+            instance._coverage_origin = instance.coverage_key()
+            instance._schedule_origin = instance.schedule_keys()
+        return instance
+
+    @classmethod
+    def shift_hours(cls, start_time):
+        """Длина смены в часах: все смены идут до SHIFT_END."""
+        if not start_time:
+            return 0.0
+        start_h, start_m = map(int, start_time.split(':'))
+        end_h, end_m = map(int, cls.SHIFT_END.split(':'))
+        return (end_h * 60 + end_m - start_h * 60 - start_m) / 60
+
+    @staticmethod
+    def staffed_cafe_id(coffee_shop_id, start_time, other_coffee_shop_id):
+        """
+        Точка, которую закрывает смена: подработка засчитывается точке, куда
+        человек ушёл, своя смена со временем — своей точке, остальное — никому.
+        """
+        if other_coffee_shop_id is not None:
+            return other_coffee_shop_id
+        if start_time is not None:
+            return coffee_shop_id
+        return None
+
+    def coverage_key(self):
+        cafe_id = self.staffed_cafe_id(self.coffee_shop_id, self.start_time, self.other_coffee_shop_id)
+        return (cafe_id, self.date) if cafe_id is not None else None
+
+    def schedule_keys(self):
+        """
+        (точка, первое число месяца) графиков, которые меняет смена: своя
+        точка — ячейка, точка подработки — её красные дни.
+        """
+        month = self.date.replace(day=1)
+        return frozenset((cafe_id, month) for cafe_id in (self.coffee_shop_id, self.other_coffee_shop_id) if cafe_id)
 
     def __str__(self):
         if self.other_coffee_shop:
@@ -47,9 +107,137 @@ class Shift(models.Model):
             return f"{self.worker.name} — Выходной"
 
 class SwapCounter(models.Model):
-    worker = models.OneToOneField(Worker, on_delete=models.PROTECT)
+    worker = models.ForeignKey(Worker, on_delete=models.PROTECT, related_name='swap_counters')
     swaps_this_month = models.PositiveIntegerField(default=0)
     month = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('worker', 'month')
+
+class DailyCoverage(models.Model):
+    cafe = models.ForeignKey(CoffeeShop, on_delete=models.CASCADE, related_name='coverage')
+    date = models.DateField()
+    staffed_count = models.IntegerField(default=0)
 
     class Meta:
-        unique_together = ('worker', 'month')
\ No newline at end of file
+        unique_together = ('cafe', 'date')
+
+    def __str__(self):
+        return f"{self.cafe} {self.date}: {self.staffed_count}"
+
+class StaffingNotification(models.Model):
+    """
+    Outbox уведомлений о недоборе: строка пишется в той же транзакции, что
+    и правка графика, а рассылает их drain_notifications. Отправленные
+    строки остаются — по ним видно, о чём уже предупредили.
+    """
+    cafe = models.ForeignKey(CoffeeShop, on_delete=models.CASCADE, related_name='notifications')
+    date = models.DateField()
+    understaffed = models.BooleanField()
+    staffed_count = models.IntegerField()
+    minimum_workers = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed_at', 'id'], name='notification_pending_idx'),
+            models.Index(fields=['cafe', 'date'], name='notification_cafe_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cafe} {self.date}: {self.staffed_count}/{self.minimum_workers}"
+
+class ShiftArchive(models.Model):
+    """Смены закрытых месяцев, перенесённые из Shift командой archive_shifts."""
+    worker = models.ForeignKey(Worker, on_delete=models.PROTECT, related_name='archived_shifts')
+    coffee_shop = models.ForeignKey(CoffeeShop, on_delete=models.PROTECT, related_name='+')
+    date = models.DateField()
+    start_time = models.CharField(max_length=5, choices=Shift.SHIFT_TIMES, blank=True, null=True)
+    other_coffee_shop = models.ForeignKey(CoffeeShop, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    display_value = models.CharField(max_length=10, blank=True, null=True)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('worker', 'date')
+        indexes = [
+            models.Index(fields=['coffee_shop', 'date'], name='archive_cafe_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.worker} {self.date}"
+
+class WorkerMonthSummary(models.Model):
+    """
+    Итоги работника за архивный месяц: смены по времени начала
+    ({'07:30': n, ...}), дни подработки по точкам ({cafe_id: n}), «+», часы и обмены.
+    """
+    worker = models.ForeignKey(Worker, on_delete=models.CASCADE, related_name='month_summaries')
+    cafe = models.ForeignKey(CoffeeShop, on_delete=models.CASCADE, related_name='+')
+    month = models.DateField()
+    by_start_time = models.JSONField(default=dict)
+    lent = models.JSONField(default=dict)
+    plus_days = models.IntegerField(default=0)
+    hours = models.FloatField(default=0)
+    swaps = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('worker', 'month')
+        indexes = [
+            models.Index(fields=['month'], name='worker_summary_month_idx'),
+        ]
+
+class CafeMonthSummary(models.Model):
+    """Итоги точки за архивный месяц: свои смены по времени начала, одолженные туда и обратно дни, недоборы."""
+    cafe = models.ForeignKey(CoffeeShop, on_delete=models.CASCADE, related_name='month_summaries')
+    month = models.DateField()
+    by_start_time = models.JSONField(default=dict)
+    borrowed_days = models.IntegerField(default=0)
+    lent_days = models.IntegerField(default=0)
+    understaffed_days = models.IntegerField(default=0)
+    swaps = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('cafe', 'month')
+
+class IdempotencyKey(models.Model):
+    """Ответ на запрос с заголовком Idempotency-Key — повтор получает его же, не выполняясь снова."""
+    key = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=200)
+    status = models.PositiveSmallIntegerField()
+    response = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+class ShiftChange(models.Model):
+    """
+    Журнал правок графика и счётчиков обменов: строки только добавляются.
+    old_value/new_value — состояние ячейки (см. journal.shift_state) или
+    {'swaps': n}; None — ячейки не было. Для обменов date — первое число месяца.
+    """
+    SHIFT = 'shift'
+    SWAPS = 'swaps'
+    KINDS = [
+        (SHIFT, 'Смена'),
+        (SWAPS, 'Обмены'),
+    ]
+
+    kind = models.CharField(max_length=5, choices=KINDS)
+    worker = models.ForeignKey(Worker, on_delete=models.PROTECT, related_name='changes')
+    cafe = models.ForeignKey(CoffeeShop, on_delete=models.PROTECT, related_name='+')
+    date = models.DateField()
+    old_value = models.JSONField(null=True)
+    new_value = models.JSONField(null=True)
+    source = models.CharField(max_length=20)
+    actor = models.CharField(max_length=150, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['worker', 'date'], name='change_worker_date_idx'),
+            models.Index(fields=['cafe', 'date'], name='change_cafe_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.worker} {self.date}: {self.old_value} → {self.new_value}"
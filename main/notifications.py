@@ -0,0 +1,129 @@
+# main/notifications.py
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import StaffingNotification
+
+logger = logging.getLogger(__name__)
+
+DRAIN_BATCH = 1000
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+class LogTransport:
+    """Транспорт по умолчанию: пишет уведомление в лог."""
+
+    def send(self, alert):
+        logger.warning(alert['text'])
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                path = getattr(settings, 'NOTIFICATION_TRANSPORT', 'main.notifications.LogTransport')
+                _transport = import_string(path)()
+    return _transport
+
+
+def reset_transport():
+    global _transport
+    with _transport_lock:
+        _transport = None
+
+
+def alert_text(row):
+    if row['understaffed']:
+        return f"Недобор в {row['cafe__name']} на {row['date']}: {row['staffed_count']} < {row['minimum_workers']}"
+    return f"{row['cafe__name']} на {row['date']}: людей снова хватает ({row['staffed_count']})"
+
+
+def drain_outbox(now=None, debounce=None, batch=DRAIN_BATCH):
+    """
+    Разбирает outbox уведомлений о недоборе — до batch дней (точка, дата)
+    за проход. Возвращает число отправленных.
+
+    Записи одной (точка, дата) схлопываются до последнего состояния. День,
+    по которому правки шли меньше debounce секунд назад, ждёт следующего
+    прохода — пока менеджер двигает людей туда-сюда, ничего не уходит.
+    Отправляется только смена состояния относительно последнего
+    отправленного: новый недобор или его исчезновение после предупреждения.
+    Если транспорт упал, записи дня остаются в очереди до следующего прохода.
+    """
+    now = now or timezone.now()
+    if debounce is None:
+        debounce = getattr(settings, 'NOTIFICATION_DEBOUNCE', 60)
+    quiet_since = now - timedelta(seconds=debounce)
+
+    # batch ограничивает число дней, а не строк: все строки дня разбираются
+    # за один проход, иначе в отправку попало бы уже перекрытое состояние
+    keys = {
+        (row['cafe_id'], row['date'])
+        for row in StaffingNotification.objects
+        .filter(processed_at__isnull=True)
+        .values('cafe_id', 'date')
+        .annotate(first=Min('id'))
+        .order_by('first')[:batch]
+    }
+    if not keys:
+        return 0
+
+    pending = {}
+    for row in (
+        StaffingNotification.objects
+        .filter(processed_at__isnull=True, cafe_id__in={c for c, _ in keys}, date__in={d for _, d in keys})
+        .order_by('id')
+        .values('id', 'cafe_id', 'cafe__name', 'date', 'understaffed',
+                'staffed_count', 'minimum_workers', 'created_at')
+    ):
+        key = (row['cafe_id'], row['date'])
+        if key in keys:
+            pending.setdefault(key, []).append(row)
+
+    ready = {key: rows for key, rows in pending.items() if rows[-1]['created_at'] <= quiet_since}
+    if not ready:
+        return 0
+
+    last_sent = {}
+    for cafe_id, d, understaffed in (
+        StaffingNotification.objects
+        .filter(processed_at__isnull=False, cafe_id__in={c for c, _ in ready}, date__in={d for _, d in ready})
+        .order_by('id')
+        .values_list('cafe_id', 'date', 'understaffed')
+    ):
+        last_sent[(cafe_id, d)] = understaffed
+
+    transport = get_transport()
+    delivered, superseded = [], []
+    for key, rows in ready.items():
+        latest = rows[-1]
+        if latest['understaffed'] != last_sent.get(key, False):
+            try:
+                transport.send({
+                    'cafe_id': latest['cafe_id'],
+                    'date': latest['date'].isoformat(),
+                    'understaffed': latest['understaffed'],
+                    'staffed': latest['staffed_count'],
+                    'required': latest['minimum_workers'],
+                    'text': alert_text(latest),
+                })
+            except Exception:
+                logger.exception('Не удалось отправить уведомление %s', key)
+                continue
+            delivered.append(latest['id'])
+            superseded.extend(row['id'] for row in rows[:-1])
+        else:
+            superseded.extend(row['id'] for row in rows)
+
+    StaffingNotification.objects.filter(id__in=superseded).delete()
+    StaffingNotification.objects.filter(id__in=delivered).update(processed_at=now)
+    return len(delivered)
@@ -0,0 +1,130 @@
+# main/payroll.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
+from .coverage import staffed_shifts
+from .models import CoffeeShop, Shift, ShiftArchive, Worker, WorkerMonthSummary
+from .schedule import archive_horizon, month_bounds, months_between
+
+
+def lent_shift_start():
+    # для подработки время в ячейке обычно не указывают — считаем её такой сменой
+    return getattr(settings, 'PAYROLL_LENT_SHIFT_START', '08:00')
+
+
+def _grouped(shifts, dates, cafe_id):
+    """(месяц, работник, точка, время начала, количество) — один GROUP BY."""
+    shifts = shifts.filter(dates)
+    if cafe_id is not None:
+        shifts = shifts.filter(staffed_cafe=cafe_id)
+    return (
+        shifts
+        .annotate(month=TruncMonth('date'))
+        .values_list('month', 'worker_id', 'staffed_cafe', 'start_time')
+        .annotate(n=Count('id'))
+    )
+
+
+def _archived_groups(start, end, cafe_id):
+    """
+    Те же группы за архивную часть диапазона: целые месяцы — из
+    WorkerMonthSummary, обрезанные края диапазона — из ShiftArchive.
+    """
+    groups = []
+    whole = [
+        month_bounds(year, month)
+        for year, month in months_between(start, end)
+        if month_bounds(year, month)[0] >= start and month_bounds(year, month)[1] <= end
+    ]
+    if whole:
+        for month, worker_id, home_cafe_id, by_start_time, lent in (
+            WorkerMonthSummary.objects
+            .filter(month__gte=whole[0][0], month__lte=whole[-1][0])
+            .values_list('month', 'worker_id', 'cafe_id', 'by_start_time', 'lent')
+        ):
+            for start_time, n in by_start_time.items():
+                groups.append((month, worker_id, home_cafe_id, start_time, n))
+            for host_id, n in lent.items():
+                groups.append((month, worker_id, int(host_id), None, n))
+        if cafe_id is not None:
+            groups = [group for group in groups if group[2] == cafe_id]
+
+    if not whole:
+        edges = [(start, end)]
+    else:
+        edges = []
+        if whole[0][0] > start:
+            edges.append((start, whole[0][0] - timedelta(days=1)))
+        if whole[-1][1] < end:
+            edges.append((whole[-1][1] + timedelta(days=1), end))
+    if edges:
+        dates = Q()
+        for edge_start, edge_end in edges:
+            dates |= Q(date__gte=edge_start, date__lte=edge_end)
+        groups += _grouped(staffed_shifts(ShiftArchive), dates, cafe_id)
+    return groups
+
+
+def payroll_rows(start, end, cafe_id=None):
+    """
+    Часы и оплата за диапазон дат по (месяц, работник, точка, где отработано).
+
+    Смены не поднимаются в модели по одной: база группирует их в одном
+    запросе до (работник, точка, месяц, время начала) с количеством, а
+    часы и деньги досчитываются по этим немногим строкам. Год по всей сети
+    — это несколько тысяч групп, а не сотни тысяч объектов. Архивные
+    месяцы берутся из помесячных итогов (WorkerMonthSummary).
+    """
+    groups = list(_grouped(staffed_shifts(), Q(date__gte=start, date__lte=end), cafe_id))
+    horizon = archive_horizon()
+    if horizon and start < horizon:
+        groups += _archived_groups(start, min(end, horizon - timedelta(days=1)), cafe_id)
+
+    default_start = lent_shift_start()
+    totals = {}
+    for month, worker_id, worked_cafe_id, start_time, n in groups:
+        key = (month, worker_id, worked_cafe_id)
+        shifts_count, hours = totals.get(key, (0, 0.0))
+        totals[key] = (shifts_count + n, hours + n * Shift.shift_hours(start_time or default_start))
+
+    workers = {
+        w['id']: w for w in Worker.objects
+        .filter(id__in={worker_id for _, worker_id, _ in totals})
+        .values('id', 'name', 'hourly_rate', 'coffee_shop_id')
+    }
+    cafes = dict(CoffeeShop.objects.values_list('id', 'name'))
+
+    rows = []
+    for (month, worker_id, worked_cafe_id), (shifts_count, hours) in sorted(totals.items()):
+        worker = workers[worker_id]
+        rows.append({
+            'month': f"{month.year}-{month.month:02d}",
+            'worker_id': worker_id,
+            'worker': worker['name'],
+            'home_cafe_id': worker['coffee_shop_id'],
+            'cafe_id': worked_cafe_id,
+            'cafe': cafes.get(worked_cafe_id, ''),
+            'shifts': shifts_count,
+            'hours': hours,
+            'rate': worker['hourly_rate'],
+            'pay': round(hours * worker['hourly_rate'], 2),
+        })
+    return rows
+
+
+def payroll_totals(rows):
+    """Итоги по работникам и по точкам для строк payroll_rows."""
+    by_worker, by_cafe = {}, {}
+    for row in rows:
+        for bucket, key, name in (
+            (by_worker, row['worker_id'], row['worker']),
+            (by_cafe, row['cafe_id'], row['cafe']),
+        ):
+            total = bucket.setdefault(key, {'id': key, 'name': name, 'shifts': 0, 'hours': 0.0, 'pay': 0.0})
+            total['shifts'] += row['shifts']
+            total['hours'] += row['hours']
+            total['pay'] = round(total['pay'] + row['pay'], 2)
+    return list(by_worker.values()), list(by_cafe.values())
@@ -0,0 +1,79 @@
+# main/pubsub.py
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class InProcessBroker:
+    """
+    Pub/sub в пределах одного процесса.
+
+    Публиковать можно из любого потока (синхронные view работают в пуле
+    потоков), подписчики — корутины ASGI-приложения. Для нескольких
+    процессов/серверов его нужно заменить брокером с тем же интерфейсом
+    (publish/listen) через настройку SCHEDULE_BROKER.
+    """
+
+    queue_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._offer, queue, message)
+
+    @staticmethod
+    def _offer(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # медленный клиент: событие теряем, при переподключении он догонит через /changes
+            pass
+
+    async def listen(self, channel, heartbeat=None):
+        """Отдаёт сообщения канала; None — если за heartbeat секунд ничего не пришло."""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber[1].get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'SCHEDULE_BROKER', 'main.pubsub.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def schedule_channel(cafe_id):
+    return f"schedule:{cafe_id}"
+
+
+def publish_schedule_event(cafe_id, event):
+    """Рассылает событие графика точки после коммита текущей транзакции."""
+    message = json.dumps(event, ensure_ascii=False)
+    transaction.on_commit(lambda: get_broker().publish(schedule_channel(cafe_id), message))
@@ -0,0 +1,328 @@
+# main/schedule.py
+import calendar
+from datetime import date, datetime, timedelta, timezone
+
+from django.conf import settings
+
+from .coverage import coverage_counts
+from .models import Shift, ShiftArchive, ShiftChange, Worker, SwapCounter
+
+WEEKDAYS = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+MAX_RANGE_DAYS = 366
+
+
+def cell_value(shift):
+    """Значение ячейки графика так, как его показывает schedule.html."""
+    if shift is None:
+        return ''
+    if shift.display_value:
+        return shift.display_value
+    if shift.other_coffee_shop:
+        return f"+ {shift.other_coffee_shop.short_code}"
+    if shift.start_time:
+        return shift.start_time
+    return ''
+
+
+def to_version(moment):
+    """Версия для клиента — updated_at в микросекундах от эпохи."""
+    if moment is None:
+        return 0
+    return int(moment.timestamp()) * 1_000_000 + moment.microsecond
+
+
+def from_version(version):
+    seconds, micros = divmod(int(version), 1_000_000)
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).replace(microsecond=micros)
+
+
+def date_header(start, end):
+    header = []
+    for offset in range((end - start).days + 1):
+        d = start + timedelta(days=offset)
+        header.append({
+            'day': d.day,
+            'weekday': WEEKDAYS[d.weekday()],
+            'date': d.isoformat()
+        })
+    return header
+
+
+def month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def month_header(year, month):
+    return date_header(*month_bounds(year, month))
+
+
+def parse_span(params):
+    """
+    Какой кусок графика запрошен: ('range', (start, end)) для ?from=&to=,
+    иначе ('month', (год, месяц)) для ?month=YYYY-MM или текущего месяца.
+    """
+    if 'from' in params or 'to' in params:
+        start = date.fromisoformat(params['from'])
+        end = date.fromisoformat(params['to'])
+        if end < start:
+            raise ValueError(f"Пустой диапазон {start} – {end}")
+        if (end - start).days >= MAX_RANGE_DAYS:
+            raise ValueError(f"Диапазон длиннее {MAX_RANGE_DAYS} дней")
+        return 'range', (start, end)
+    if params.get('month'):
+        month_start = date.fromisoformat(params['month'] + '-01')
+        return 'month', (month_start.year, month_start.month)
+    today = date.today()
+    return 'month', (today.year, today.month)
+
+
+def archive_horizon(today=None):
+    """
+    Первый «горячий» месяц: всё раньше него archive_shifts уносит в
+    ShiftArchive. None — архивация выключена (ARCHIVE_KEEP_MONTHS не задан).
+    """
+    keep = getattr(settings, 'ARCHIVE_KEEP_MONTHS', None)
+    if not keep:
+        return None
+    today = today or date.today()
+    month = today.year * 12 + today.month - 1 - (keep - 1)
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def span_bounds(params):
+    """Первый и последний день запрошенного куска графика (см. parse_span)."""
+    kind, span = parse_span(params)
+    return span if kind == 'range' else month_bounds(*span)
+
+
+def adjacent_months(year, month):
+    previous = (year - 1, 12) if month == 1 else (year, month - 1)
+    following = (year + 1, 1) if month == 12 else (year, month + 1)
+    return previous, following
+
+
+def months_between(start, end):
+    """(год, месяц) всех месяцев, которые задевает диапазон."""
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _grid(workers, start, end):
+    """
+    Строки сетки за диапазон одним запросом смен (плюс один к архиву для
+    месяцев за горизонтом); плюс время последней правки.
+    """
+    shifts = (
+        Shift.objects
+        .filter(worker__in=workers, date__gte=start, date__lte=end)
+        .select_related('other_coffee_shop')
+        .order_by()
+    )
+    horizon = archive_horizon()
+    if horizon and start < horizon:
+        # архивные ячейки первыми: поправленная после архивации ячейка в Shift их перекроет
+        archived = (
+            ShiftArchive.objects
+            .filter(worker__in=workers, date__gte=start, date__lte=end)
+            .select_related('other_coffee_shop')
+            .order_by()
+        )
+        shifts = [*archived, *shifts]
+    shift_by_cell = {}
+    last_change = None
+    for shift in shifts:
+        shift_by_cell[(shift.worker_id, shift.date)] = shift
+        if last_change is None or shift.updated_at > last_change:
+            last_change = shift.updated_at
+
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    rows = []
+    for worker in workers:
+        rows.append({
+            'id': worker.id,
+            'name': worker.name,
+            'data': [cell_value(shift_by_cell.get((worker.id, d))) for d in days],
+        })
+    return rows, last_change
+
+
+def build_schedule(cafe, year, month):
+    """
+    Собирает payload для /api/schedule/<cafe_id>/ за месяц.
+
+    Работники, смены (вместе с other_coffee_shop), счётчики обменов и
+    покрытие по дням (DailyCoverage) читаются фиксированным числом
+    запросов — четыре штуки, независимо от количества работников и дней.
+    Сетка собирается в памяти.
+    """
+    month_start, month_end = month_bounds(year, month)
+    workers = list(Worker.objects.filter(coffee_shop=cafe))
+    rows, last_change = _grid(workers, month_start, month_end)
+
+    swaps = {}
+    for worker_id, swaps_this_month, updated_at in (
+        SwapCounter.objects
+        .filter(worker__in=workers, month=month_start)
+        .values_list('worker_id', 'swaps_this_month', 'updated_at')
+    ):
+        swaps[worker_id] = swaps_this_month
+        if last_change is None or updated_at > last_change:
+            last_change = updated_at
+    for row in rows:
+        row['swaps'] = swaps.get(row['id'], 0)
+
+    return {
+        'cafe_name': cafe.name,
+        'header': month_header(year, month),
+        'rows': rows,
+        'red_days': month_red_days(cafe, year, month),
+        'minimum_required': cafe.minimum_workers,
+        'current_month': f"{year}-{month:02d}",
+        'version': to_version(last_change),
+    }
+
+
+def build_schedule_range(cafe, start, end):
+    """
+    Сетка точки за произвольный диапазон дат — те же три запроса (работники,
+    смены, покрытие) на любую длину. Счётчики обменов помесячные, поэтому
+    в строках их нет, а red_days — ISO-даты, а не номера дней.
+    """
+    workers = list(Worker.objects.filter(coffee_shop=cafe))
+    rows, last_change = _grid(workers, start, end)
+    counts = coverage_counts(cafe, start, end)
+    header = date_header(start, end)
+    return {
+        'cafe_name': cafe.name,
+        'header': header,
+        'rows': rows,
+        'red_days': [
+            day['date'] for day in header
+            if counts.get(date.fromisoformat(day['date']), 0) < cafe.minimum_workers
+        ],
+        'minimum_required': cafe.minimum_workers,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'version': to_version(last_change),
+    }
+
+
+def compact_schedule(payload):
+    """
+    Компактный вид payload'а графика (?format=compact) для больших точек.
+
+    Вместо header — первый день и число дней; значения ячеек собраны в
+    таблицу строк values (values[0] — пустая ячейка), а строки сетки —
+    массивы индексов в ней. red_days — битовая маска в hex: бит i означает
+    недобор в день start + i.
+    """
+    header = payload['header']
+    by_day = 'current_month' in payload  # в помесячном red_days номера дней, в диапазоне — даты
+    red = set(payload['red_days'])
+    mask = 0
+    for i, day in enumerate(header):
+        if (day['day'] if by_day else day['date']) in red:
+            mask |= 1 << i
+
+    values = ['']
+    index = {'': 0}
+    rows = []
+    for row in payload['rows']:
+        cells = []
+        for value in row['data']:
+            if value not in index:
+                index[value] = len(values)
+                values.append(value)
+            cells.append(index[value])
+        rows.append({**{k: v for k, v in row.items() if k != 'data'}, 'cells': cells})
+
+    compact = {k: v for k, v in payload.items() if k not in ('header', 'rows', 'red_days')}
+    compact.update({
+        'format': 'compact',
+        'start': header[0]['date'],
+        'days': len(header),
+        'values': values,
+        'rows': rows,
+        'red_days': f'{mask:x}',
+    })
+    return compact
+
+
+def month_red_days(cafe, year, month):
+    month_start, month_end = month_bounds(year, month)
+    counts = coverage_counts(cafe, month_start, month_end)
+    return [
+        day for day in range(1, month_end.day + 1)
+        if counts.get(date(year, month, day), 0) < cafe.minimum_workers
+    ]
+
+
+def day_states(cafe, dates, counts=None):
+    """
+    Пересчитанный признак недобора для каждой из дат — для точечного патча
+    сетки. counts — уже известное покрытие {дата: n}, тогда без запроса.
+    """
+    if counts is None:
+        counts = coverage_counts(cafe, min(dates), max(dates))
+    return [
+        {'date': d.isoformat(), 'red': counts.get(d, 0) < cafe.minimum_workers}
+        for d in sorted(set(dates))
+    ]
+
+
+def schedule_changes(cafe, year, month, since):
+    """
+    Что изменилось в графике точки за месяц после версии since.
+
+    Возвращает изменившиеся ячейки и счётчики обменов плюс red_days всего
+    месяца (одно чтение DailyCoverage), чтобы клиент мог пропатчить таблицу
+    без полной перезагрузки. Удалённые строки Shift находятся по
+    надгробиям в журнале ShiftChange и приходят пустыми ячейками.
+    """
+    since_moment = from_version(since)
+    month_start, month_end = month_bounds(year, month)
+    last_change = since_moment if since else None
+
+    cells = {}
+    for worker_id, d, created_at in (
+        ShiftChange.objects
+        .filter(cafe=cafe, kind=ShiftChange.SHIFT, date__gte=month_start, date__lte=month_end,
+                new_value__isnull=True, created_at__gt=since_moment)
+        .values_list('worker_id', 'date', 'created_at')
+    ):
+        cells[(worker_id, d)] = {'worker_id': worker_id, 'date': d.isoformat(), 'value': ''}
+        if last_change is None or created_at > last_change:
+            last_change = created_at
+
+    for shift in (
+        Shift.objects
+        .filter(worker__in=Worker.objects.filter(coffee_shop=cafe).values('id'),
+                date__gte=month_start, date__lte=month_end, updated_at__gt=since_moment)
+        .select_related('other_coffee_shop')
+        .order_by()
+    ):
+        # ячейку, заполненную заново после удаления, отдаём с новым значением
+        cells[(shift.worker_id, shift.date)] = {
+            'worker_id': shift.worker_id, 'date': shift.date.isoformat(), 'value': cell_value(shift),
+        }
+        if last_change is None or shift.updated_at > last_change:
+            last_change = shift.updated_at
+
+    swaps = []
+    for worker_id, swaps_this_month, updated_at in (
+        SwapCounter.objects
+        .filter(worker__coffee_shop=cafe, month=month_start, updated_at__gt=since_moment)
+        .values_list('worker_id', 'swaps_this_month', 'updated_at')
+    ):
+        swaps.append({'worker_id': worker_id, 'swaps': swaps_this_month})
+        if last_change is None or updated_at > last_change:
+            last_change = updated_at
+
+    return {
+        'version': to_version(last_change),
+        'cells': list(cells.values()),
+        'swaps': swaps,
+        'red_days': month_red_days(cafe, year, month),
+    }
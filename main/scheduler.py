@@ -0,0 +1,143 @@
+# main/scheduler.py
+from datetime import date
+
+from .coverage import coverage_counts
+from .models import Shift, Worker
+from .payroll import lent_shift_start
+from .schedule import month_bounds
+
+# смены от длинной к короткой: первым на день ставится открытие
+SHIFT_OPTIONS = sorted((value for value, _ in Shift.SHIFT_TIMES), key=Shift.shift_hours, reverse=True)
+MAX_IMPROVEMENT_ROUNDS = 2000
+
+
+def solve(workers, days, need, busy=None, days_off=None, max_shifts=None, base_hours=None, base_shifts=None):
+    """
+    Раскладывает смены по дням: жадно закрывает потребность need[day],
+    затем локальными улучшениями выравнивает часы.
+
+    workers — id работников, days — дни; busy и days_off — {worker: set(дней)},
+    в которые человека ставить нельзя (уже есть ячейка / выходной по просьбе);
+    max_shifts — {worker: сколько смен всего можно}; base_hours и base_shifts —
+    уже набранные часы и смены из зафиксированных ячеек.
+
+    Возвращает ({(worker, day): start_time}, {worker: часы}, [недозакрытые дни]).
+    """
+    busy = busy or {}
+    days_off = days_off or {}
+    max_shifts = max_shifts or {}
+    hours = {w: float((base_hours or {}).get(w, 0)) for w in workers}
+    shifts = {w: (base_shifts or {}).get(w, 0) for w in workers}
+    blocked = {w: busy.get(w, set()) | days_off.get(w, set()) for w in workers}
+    assigned_days = {w: {} for w in workers}
+
+    def can_take(w, day):
+        return (
+            day not in blocked[w]
+            and day not in assigned_days[w]
+            and shifts[w] < max_shifts.get(w, len(days))
+        )
+
+    def assign(w, day, start_time):
+        assigned_days[w][day] = start_time
+        hours[w] += Shift.shift_hours(start_time)
+        shifts[w] += 1
+
+    def unassign(w, day):
+        start_time = assigned_days[w].pop(day)
+        hours[w] -= Shift.shift_hours(start_time)
+        shifts[w] -= 1
+        return start_time
+
+    # сначала самые «тесные» дни — где свободных людей меньше всего относительно нужды
+    order = sorted(
+        (d for d in days if need.get(d, 0) > 0),
+        key=lambda d: sum(d not in blocked[w] for w in workers) - need[d],
+    )
+    unfilled = []
+    for day in order:
+        candidates = sorted((w for w in workers if can_take(w, day)), key=lambda w: (hours[w], shifts[w]))
+        picked = candidates[:need[day]]
+        if len(picked) < need[day]:
+            unfilled.append(day)
+        # самый «недогруженный» получает самую длинную смену
+        for i, w in enumerate(picked):
+            assign(w, day, SHIFT_OPTIONS[i % len(SHIFT_OPTIONS)])
+
+    # локальные улучшения: переносим смену или меняемся временем между самым
+    # загруженным и самым свободным, пока разброс часов уменьшается
+    for _ in range(MAX_IMPROVEMENT_ROUNDS):
+        if len(workers) < 2:
+            break
+        heavy = max(workers, key=lambda w: hours[w])
+        light = min(workers, key=lambda w: hours[w])
+        gap = hours[heavy] - hours[light]
+        improved = False
+        for day, start_time in sorted(assigned_days[heavy].items(), key=lambda item: -Shift.shift_hours(item[1])):
+            length = Shift.shift_hours(start_time)
+            if length < gap and can_take(light, day):
+                unassign(heavy, day)
+                assign(light, day, start_time)
+                improved = True
+                break
+            other_time = assigned_days[light].get(day)
+            if other_time is not None:
+                delta = length - Shift.shift_hours(other_time)
+                if 0 < delta < gap:
+                    assigned_days[heavy][day], assigned_days[light][day] = other_time, start_time
+                    hours[heavy] -= delta
+                    hours[light] += delta
+                    improved = True
+                    break
+        if not improved:
+            break
+
+    plan = {(w, day): start_time for w in workers for day, start_time in assigned_days[w].items()}
+    return plan, hours, sorted(unfilled)
+
+
+def generate_month(cafe, year, month, constraints=None):
+    """
+    Составляет график точки на месяц поверх уже заполненных ячеек.
+
+    Любая непустая ячейка (своя смена, подработка, «+», выходной) считается
+    зафиксированной. Потребность дня — minimum_workers минус текущее
+    покрытие (с учётом одолженных к нам людей). constraints —
+    {worker_id: {'days_off': ['YYYY-MM-DD', ...], 'max_shifts': n}}.
+
+    Возвращает (правки для apply_edits, часы по работникам, недозакрытые даты).
+    """
+    constraints = {int(k): v for k, v in (constraints or {}).items()}
+    month_start, month_end = month_bounds(year, month)
+    days = [date(year, month, day) for day in range(1, month_end.day + 1)]
+    workers = list(Worker.objects.filter(coffee_shop=cafe).values_list('id', flat=True))
+
+    # подработка без времени считается часами, как в расчёте зарплаты,
+    # иначе балансировка охотнее одалживает людей, чем ставит их к себе
+    lent_start = lent_shift_start()
+    busy, base_hours, base_shifts = {}, {}, {}
+    for worker_id, d, start_time, other_cafe_id in Shift.objects.filter(
+        worker__in=workers, date__gte=month_start, date__lte=month_end
+    ).values_list('worker_id', 'date', 'start_time', 'other_coffee_shop_id').order_by():
+        busy.setdefault(worker_id, set()).add(d)
+        if start_time or other_cafe_id:
+            hours = Shift.shift_hours(start_time or lent_start)
+            base_hours[worker_id] = base_hours.get(worker_id, 0) + hours
+            base_shifts[worker_id] = base_shifts.get(worker_id, 0) + 1
+
+    coverage = coverage_counts(cafe, month_start, month_end)
+    need = {d: max(0, cafe.minimum_workers - coverage.get(d, 0)) for d in days}
+
+    plan, hours, unfilled = solve(
+        workers, days, need,
+        busy=busy,
+        days_off={w: {date.fromisoformat(d) for d in c.get('days_off', [])} for w, c in constraints.items()},
+        max_shifts={w: c['max_shifts'] for w, c in constraints.items() if c.get('max_shifts') is not None},
+        base_hours=base_hours,
+        base_shifts=base_shifts,
+    )
+    edits = [
+        {'worker_id': w, 'date': d.isoformat(), 'start_time': start_time}
+        for (w, d), start_time in sorted(plan.items(), key=lambda item: (item[0][1], item[0][0]))
+    ]
+    return edits, hours, unfilled
@@ -0,0 +1,79 @@
+# main/seeding.py
+import calendar
+import random
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from .coverage import rebuild_coverage
+from .models import CoffeeShop, Shift, SwapCounter, Worker
+
+# доли типов ячеек в «живом» графике: смены с открытия чаще, подработка редко
+CELL_WEIGHTS = [
+    ('07:30', 30),
+    ('08:00', 20),
+    ('10:00', 15),
+    ('other', 5),
+    ('plus', 2),
+    ('off', 28),
+]
+
+
+def add_months(d, months):
+    month = d.month - 1 + months
+    return date(d.year + month // 12, month % 12 + 1, 1)
+
+
+@transaction.atomic
+def seed_schedule(cafes, workers, months, start=None, prefix='S', rng=None):
+    """
+    Заполняет базу синтетическими данными: cafes точек × workers работников
+    × months месяцев смен и счётчиков обменов, начиная с месяца start.
+    Возвращает созданные точки.
+    """
+    rng = rng or random.Random(0)
+    start = start or date.today().replace(day=1)
+
+    shops = CoffeeShop.objects.bulk_create([
+        CoffeeShop(name=f'Точка {prefix}{i}', short_code=f'{prefix}{i}', minimum_workers=max(1, workers // 3))
+        for i in range(1, cafes + 1)
+    ])
+    staff = Worker.objects.bulk_create([
+        Worker(
+            name=f'Работник {shop.short_code}-{i}',
+            phone_number=f'+7900{rng.randrange(10 ** 7):07d}',
+            experience_years=rng.randrange(6),
+            start_date_experience_years=date(2020, 1, 1) + timedelta(days=rng.randrange(1500)),
+            hourly_rate=rng.choice([250, 280, 300, 350]),
+            coffee_shop=shop,
+        )
+        for shop in shops
+        for i in range(1, workers + 1)
+    ])
+
+    kinds = [kind for kind, _ in CELL_WEIGHTS]
+    weights = [weight for _, weight in CELL_WEIGHTS]
+    shifts = []
+    counters = []
+    for m in range(months):
+        month_start = add_months(start, m)
+        days = calendar.monthrange(month_start.year, month_start.month)[1]
+        for worker in staff:
+            counters.append(SwapCounter(worker=worker, month=month_start, swaps_this_month=rng.randrange(5)))
+            for day in range(days):
+                kind = rng.choices(kinds, weights)[0]
+                if kind == 'off':
+                    continue
+                shift = Shift(worker=worker, coffee_shop=worker.coffee_shop, date=month_start + timedelta(days=day))
+                if kind == 'other' and len(shops) > 1:
+                    shift.other_coffee_shop = rng.choice([s for s in shops if s.id != worker.coffee_shop_id])
+                elif kind == 'plus':
+                    shift.display_value = '+'
+                else:
+                    shift.start_time = kind if kind != 'other' else '10:00'
+                shifts.append(shift)
+
+    Shift.objects.bulk_create(shifts, batch_size=1000)
+    SwapCounter.objects.bulk_create(counters, batch_size=1000)
+    rebuild_coverage()
+    return shops
@@ -0,0 +1,78 @@
+# main/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_coffee_shops_version, bump_schedule_version, bump_workers_version
+from .coverage import track_shift_delete, track_shift_save
+from .journal import ChangeBuffer, shift_state
+from .models import CoffeeShop, Shift, Worker
+
+
+def _bump_schedules(keys):
+    for cafe_id, month in keys:
+        transaction.on_commit(lambda cafe_id=cafe_id, month=month: bump_schedule_version(cafe_id, month))
+
+
+@receiver([post_save, post_delete], sender=CoffeeShop)
+def coffee_shop_changed(sender, **kwargs):
+    # список точек меняется только через админку
+    bump_coffee_shops_version()
+
+
+@receiver(pre_save, sender=Worker)
+def worker_loading_origin(sender, instance, raw=False, **kwargs):
+    # при переводе в другую точку работник пропадает из графика старой
+    if raw or instance.pk is None:
+        instance._cafe_origin = None
+        return
+    instance._cafe_origin = Worker.objects.filter(pk=instance.pk).values_list('coffee_shop_id', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Worker)
+def worker_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for cafe_id in {instance.coffee_shop_id, getattr(instance, '_cafe_origin', None)} - {None}:
+        transaction.on_commit(lambda cafe_id=cafe_id: bump_workers_version(cafe_id))
+
+
+@receiver([pre_save, pre_delete], sender=Shift)
+def shift_loading_origin(sender, instance, raw=False, **kwargs):
+    # смена не из from_db (или с отложенными полями) — узнаём, что она закрывала до правки
+    if raw or instance.pk is None or '_coverage_origin' in instance.__dict__:
+        return
+    old = Shift.objects.filter(pk=instance.pk).first()
+    instance._coverage_origin = old.coverage_key() if old else None
+    instance._schedule_origin = old.schedule_keys() if old else frozenset()
+
+
+@receiver(pre_delete, sender=Shift)
+def shift_deleting(sender, instance, **kwargs):
+    # что лежало в ячейке — для журнала; у смены с отложенными полями читаем заново
+    shift = Shift.objects.filter(pk=instance.pk).first() if instance.get_deferred_fields() else instance
+    instance._deleted_cell = (shift.worker_id, shift.coffee_shop_id, shift.date, shift_state(shift)) if shift else None
+
+
+@receiver(post_save, sender=Shift)
+def shift_saved(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    track_shift_save(instance)
+    # смены, сохранённые мимо apply_edits (админка, shell, скрипты), тоже
+    # должны сдвигать версии графиков — иначе ETag отвечает 304 вечно
+    _bump_schedules(instance._schedule_origin | instance.schedule_keys())
+    instance._schedule_origin = instance.schedule_keys()
+
+
+@receiver(post_delete, sender=Shift)
+def shift_deleted(sender, instance, **kwargs):
+    track_shift_delete(instance)
+    if instance._deleted_cell:
+        # удаление в журнале — надгробие, по которому /changes сообщает об опустевшей ячейке
+        journal = ChangeBuffer.from_context()
+        journal.shift(*instance._deleted_cell[:3], instance._deleted_cell[3], None)
+        journal.flush()
+    # поля удалённой смены могли быть не загружены — берём то, что узнал pre_delete
+    _bump_schedules(instance._schedule_origin)
+    instance._schedule_origin = frozenset()
@@ -0,0 +1,26 @@
+# main/staffing.py
+from .coverage import coverage_counts
+from .models import StaffingNotification
+
+
+def check_and_notify_understaffed_days(cafe, dates, counts=None):
+    """
+    Проверяет укомплектованность точки за несколько дней одним чтением
+    DailyCoverage (или по уже известному покрытию counts {дата: n}) и кладёт
+    состояние каждого дня в outbox. Вызывается в транзакции правки:
+    уведомление появится ровно вместе с ней, а сама отправка (Web Push /
+    FCM) идёт вне запроса — см. main.notifications.
+    """
+    dates = sorted(set(dates))
+    if counts is None:
+        counts = coverage_counts(cafe, dates[0], dates[-1])
+    StaffingNotification.objects.bulk_create([
+        StaffingNotification(
+            cafe=cafe,
+            date=d,
+            understaffed=counts.get(d, 0) < cafe.minimum_workers,
+            staffed_count=counts.get(d, 0),
+            minimum_workers=cafe.minimum_workers,
+        )
+        for d in dates
+    ])
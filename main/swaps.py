@@ -0,0 +1,38 @@
+# main/swaps.py
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .journal import ChangeBuffer
+from .models import SwapCounter, Worker
+
+
+@transaction.atomic
+def increment_swaps(worker_id, month, source='api', actor='', cafe_id=None):
+    """
+    Атомарно прибавляет обмен работнику за месяц и возвращает новое значение.
+
+    Увеличение идёт одним UPDATE с F(), так что параллельные клики не теряют
+    друг друга; строка месяца создаётся лениво, при первом обмене. Было/стало
+    пишется в журнал ShiftChange в той же транзакции; cafe_id — точка
+    работника, если вызывающий её уже знает (иначе лишний запрос).
+    """
+    rows = SwapCounter.objects.filter(worker_id=worker_id, month=month)
+    created = False
+    # update() обходит auto_now — время правки ставим сами
+    if not rows.update(swaps_this_month=F('swaps_this_month') + 1, updated_at=timezone.now()):
+        try:
+            with transaction.atomic():
+                SwapCounter.objects.create(worker_id=worker_id, month=month, swaps_this_month=1)
+            created = True
+        except IntegrityError:
+            # счётчик успел создать параллельный запрос
+            rows.update(swaps_this_month=F('swaps_this_month') + 1, updated_at=timezone.now())
+    swaps = rows.values_list('swaps_this_month', flat=True).get()
+
+    journal = ChangeBuffer(source, actor)
+    if cafe_id is None:
+        cafe_id = Worker.objects.values_list('coffee_shop_id', flat=True).get(id=worker_id)
+    journal.swaps(worker_id, cafe_id, month, None if created else swaps - 1, swaps)
+    journal.flush()
+    return swaps
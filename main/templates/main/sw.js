@@ -0,0 +1,89 @@
+{% load static %}// Service worker графика: статика — из кеша, график и список точек —
+// stale-while-revalidate, правки не трогаем (их очередь живёт на странице).
+const VERSION = 'v1';
+const STATIC_CACHE = `static-${VERSION}`;
+const DATA_CACHE = `data-${VERSION}`;
+const PRECACHE = [
+  '{% static "bootstrap/css/bootstrap.min.css" %}',
+  '{% static "bootstrap/js/bootstrap.bundle.min.js" %}',
+  '{% static "manifest.json" %}',
+  '{% static "android-chrome-192x192.png" %}',
+];
+const STATIC_PREFIX = '{% get_static_prefix %}';
+
+self.addEventListener('install', (event) => {
+  event.waitUntil(caches.open(STATIC_CACHE).then(cache => cache.addAll(PRECACHE)));
+  self.skipWaiting();
+});
+
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(
+        keys.filter(key => key !== STATIC_CACHE && key !== DATA_CACHE).map(key => caches.delete(key))
+      ))
+      .then(() => self.clients.claim())
+  );
+});
+
+function isScheduleData(url) {
+  return /^\/api\/schedule\/\d+\/$/.test(url.pathname) || url.pathname === '/api/coffee-shops/';
+}
+
+function isSchedulePage(request, url) {
+  return request.mode === 'navigate' && /^\/schedule\/\d+\/$/.test(url.pathname);
+}
+
+// ?prefetch=1 не меняет ответ — в кеше это тот же месяц
+function cacheKey(url) {
+  const key = new URL(url);
+  key.searchParams.delete('prefetch');
+  return key.toString();
+}
+
+async function cacheFirst(request) {
+  const cached = await caches.match(request);
+  if (cached) return cached;
+  const response = await fetch(request);
+  if (response.ok) {
+    const cache = await caches.open(STATIC_CACHE);
+    cache.put(request, response.clone());
+  }
+  return response;
+}
+
+async function notifyRefreshed(url) {
+  const clients = await self.clients.matchAll({ type: 'window' });
+  clients.forEach(client => client.postMessage({ type: 'refreshed', url }));
+}
+
+function staleWhileRevalidate(event, url) {
+  const key = cacheKey(url);
+  const cached = caches.open(DATA_CACHE).then(cache => cache.match(key));
+  const network = fetch(event.request).then(async response => {
+    if (response.ok) {
+      const cache = await caches.open(DATA_CACHE);
+      const previous = await cache.match(key);
+      await cache.put(key, response.clone());
+      // страница уже нарисовала старую копию — подскажем ей перечитать
+      if (previous && previous.headers.get('ETag') !== response.headers.get('ETag')) {
+        notifyRefreshed(key);
+      }
+    }
+    return response;
+  });
+  event.waitUntil(network.catch(() => {}));
+  return cached.then(response => response || network);
+}
+
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  const url = new URL(request.url);
+  if (request.method !== 'GET' || url.origin !== self.location.origin) return;
+
+  if (url.pathname.startsWith(STATIC_PREFIX)) {
+    event.respondWith(cacheFirst(request));
+  } else if (isScheduleData(url) || isSchedulePage(request, url)) {
+    event.respondWith(staleWhileRevalidate(event, url));
+  }
+});
@@ -1,3 +1,1290 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import (
+    CafeMonthSummary, CoffeeShop, DailyCoverage, IdempotencyKey, Shift, ShiftArchive, ShiftChange,
+    StaffingNotification, SwapCounter, Worker, WorkerMonthSummary,
+)
+from .benchmark import compare, write_load
+from .cache import cache_stats, reset_cache_stats
+from .notifications import drain_outbox, reset_transport
+from .middleware import UNRESOLVED, QueryInstrumentationMiddleware, perf_report, reset_perf_stats
+from .pubsub import InProcessBroker, get_broker
+from .bulk import apply_edits
+from .coverage import refresh_coverage
+from .payroll import payroll_rows
+from .importer import import_schedule
+from .scheduler import solve
+from .seeding import seed_schedule
+from .swaps import increment_swaps
+from .schedule import build_schedule, day_states, schedule_changes
+
+
+def make_worker(cafe, name):
+    return Worker.objects.create(
+        name=name,
+        phone_number='000',
+        experience_years=1,
+        start_date_experience_years=date(2024, 1, 1),
+        hourly_rate=300,
+        coffee_shop=cafe,
+    )
+
+
+class ScheduleGridTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=2)
+        self.other = CoffeeShop.objects.create(name='dz', short_code='Дз', minimum_workers=1)
+
+    def test_payload(self):
+        anna = make_worker(self.cafe, 'Анна')
+        oleg = make_worker(self.cafe, 'Олег')
+        make_worker(self.other, 'Чужой')
+        Shift.objects.create(worker=anna, coffee_shop=self.cafe, date=date(2025, 2, 1), start_time='07:30')
+        Shift.objects.create(worker=oleg, coffee_shop=self.cafe, date=date(2025, 2, 1), other_coffee_shop=self.other)
+        Shift.objects.create(worker=oleg, coffee_shop=self.cafe, date=date(2025, 2, 2), display_value='+')
+        Shift.objects.create(worker=anna, coffee_shop=self.cafe, date=date(2025, 3, 1), start_time='08:00')
+        SwapCounter.objects.create(worker=anna, month=date(2025, 2, 1), swaps_this_month=3)
+
+        data = build_schedule(self.cafe, 2025, 2)
+
+        self.assertEqual(data['current_month'], '2025-02')
+        self.assertEqual(len(data['header']), 28)
+        self.assertEqual(data['header'][0], {'day': 1, 'weekday': 'Сб', 'date': '2025-02-01'})
+        self.assertEqual([r['name'] for r in data['rows']], ['Анна', 'Олег'])
+        self.assertEqual(data['rows'][0]['data'][:2], ['07:30', ''])
+        self.assertEqual(data['rows'][1]['data'][:2], ['+ Дз', '+'])
+        self.assertEqual([r['swaps'] for r in data['rows']], [3, 0])
+        # Олег подрабатывает на Дз — 1 февраля он закрывает её, а не свою точку
+        self.assertEqual(data['red_days'], list(range(1, 29)))
+        self.assertNotIn(1, build_schedule(self.other, 2025, 2)['red_days'])
+
+    def test_query_count_does_not_depend_on_size(self):
+        for i in range(15):
+            worker = make_worker(self.cafe, f'w{i}')
+            for day in range(1, 29):
+                Shift.objects.create(worker=worker, coffee_shop=self.cafe, date=date(2025, 2, day), start_time='10:00')
+
+        with CaptureQueriesContext(connection) as ctx:
+            build_schedule(self.cafe, 2025, 2)
+        self.assertEqual(len(ctx.captured_queries), 4)
+
+    def test_schedule_view_does_not_write(self):
+        make_worker(self.cafe, 'Анна')
+        response = self.client.get(f'/api/schedule/{self.cafe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(SwapCounter.objects.exists())
+
+
+class ScheduleCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.worker = make_worker(self.cafe, 'Анна')
+        self.url = f'/api/schedule/{self.cafe.id}/'
+
+    def test_repeat_load_skips_database(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second['X-Schedule-Cache'], 'hit')
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_writes_invalidate(self):
+        self.client.get(self.url)
+        today = date.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/shift/update/', json.dumps({
+                'worker_id': self.worker.id,
+                'date': today.isoformat(),
+                'start_time': '08:00',
+            }), content_type='application/json')
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Schedule-Cache'], 'miss')
+        self.assertEqual(response.json()['rows'][0]['data'][today.day - 1], '08:00')
+
+        self.client.post('/api/swap/increment/', json.dumps({
+            'worker_id': self.worker.id,
+        }), content_type='application/json')
+        self.assertEqual(self.client.get(self.url).json()['rows'][0]['swaps'], 1)
+
+
+class ScheduleCacheCheckTests(TestCase):
+    def test_deploy_check_warns_about_process_local_cache(self):
+        from .checks import schedule_cache_is_shared
+
+        self.assertEqual([w.id for w in schedule_cache_is_shared(None)], ['main.W001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(schedule_cache_is_shared(None), [])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.worker = make_worker(self.cafe, 'Анна')
+        self.url = f'/api/schedule/{self.cafe.id}/'
+
+    def test_schedule_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/shift/update/', json.dumps({
+                'worker_id': self.worker.id,
+                'date': date.today().isoformat(),
+                'start_time': '07:30',
+            }), content_type='application/json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_worker_and_direct_shift_changes_bump_etag(self):
+        other = CoffeeShop.objects.create(name='dz', short_code='Дз', minimum_workers=1)
+        other_url = f'/api/schedule/{other.id}/'
+
+        def changed(url, action):
+            etag = self.client.get(url)['ETag']
+            with self.captureOnCommitCallbacks(execute=True):
+                action()
+            return self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+        self.assertTrue(changed(self.url, lambda: make_worker(self.cafe, 'Олег')))
+        moved = Worker.objects.get(name='Олег')
+        moved.coffee_shop = other
+        self.assertTrue(changed(self.url, moved.save))
+        self.assertTrue(changed(other_url, lambda: Shift.objects.create(
+            worker=self.worker, coffee_shop=self.cafe, date=date.today(), other_coffee_shop=other,
+        )))
+        self.assertTrue(changed(self.url, lambda: Shift.objects.filter(worker=self.worker).delete()))
+
+    def test_coffee_shops_not_modified(self):
+        etag = self.client.get('/api/coffee-shops/')['ETag']
+        response = self.client.get('/api/coffee-shops/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        CoffeeShop.objects.create(name='dz', short_code='Дз')
+        response = self.client.get('/api/coffee-shops/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+
+class BulkUpdateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.other = CoffeeShop.objects.create(name='dz', short_code='Дз', minimum_workers=1)
+        self.anna = make_worker(self.cafe, 'Анна')
+        self.oleg = make_worker(self.cafe, 'Олег')
+
+    def post(self, edits):
+        return self.client.post('/api/shift/bulk/', json.dumps({'edits': edits}), content_type='application/json')
+
+    def test_range_and_single_cells(self):
+        response = self.post([
+            # 2025-03-03 — понедельник
+            {'worker_id': self.anna.id, 'from': '2025-03-03', 'to': '2025-03-09', 'weekdays': [0, 1, 2, 3, 4], 'start_time': '07:30'},
+            {'worker_id': self.oleg.id, 'date': '2025-03-04', 'other_cafe_id': self.other.id},
+            {'worker_id': self.oleg.id, 'date': '2025-03-05'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        changed = response.json()['changed']
+        self.assertEqual(len(changed), 6)
+        self.assertIn({'worker_id': self.oleg.id, 'date': '2025-03-04', 'value': '+ Дз'}, changed)
+        self.assertEqual(Shift.objects.filter(worker=self.anna, start_time='07:30').count(), 5)
+
+        response = self.post([
+            {'worker_id': self.anna.id, 'date': '2025-03-03', 'start_time': '07:30'},
+            {'worker_id': self.anna.id, 'date': '2025-03-04', 'start_time': '10:00'},
+        ])
+        self.assertEqual(response.json()['changed'], [
+            {'worker_id': self.anna.id, 'date': '2025-03-04', 'value': '10:00'},
+        ])
+        self.assertEqual(Shift.objects.count(), 6)
+
+    def test_invalid_edit_writes_nothing(self):
+        response = self.post([
+            {'worker_id': self.anna.id, 'date': '2025-03-03', 'start_time': '07:30'},
+            {'worker_id': self.anna.id, 'date': '2025-03-04', 'start_time': '06:00'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Shift.objects.exists())
+
+
+class ScheduleDeltaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.worker = make_worker(self.cafe, 'Анна')
+        self.today = date.today()
+
+    def test_update_shift_returns_patch(self):
+        response = self.client.post('/api/shift/update/', json.dumps({
+            'worker_id': self.worker.id,
+            'date': self.today.isoformat(),
+            'start_time': '08:00',
+        }), content_type='application/json')
+        self.assertEqual(response.json(), {
+            'status': 'ok',
+            'cells': [{'worker_id': self.worker.id, 'date': self.today.isoformat(), 'value': '08:00'}],
+            'days': [{'cafe_id': self.cafe.id, 'date': self.today.isoformat(), 'red': False}],
+        })
+
+        response = self.client.post('/api/swap/increment/', json.dumps({
+            'worker_id': self.worker.id,
+        }), content_type='application/json')
+        self.assertEqual(response.json(), {
+            'worker_id': self.worker.id,
+            'month': f'{self.today.year}-{self.today.month:02d}',
+            'swaps': 1,
+        })
+
+    def test_changes_since_version(self):
+        version = self.client.get(f'/api/schedule/{self.cafe.id}/').json()['version']
+        self.assertEqual(version, 0)
+
+        Shift.objects.create(worker=self.worker, coffee_shop=self.cafe, date=self.today, start_time='07:30')
+        data = self.client.get(f'/api/schedule/{self.cafe.id}/changes', {'since': version}).json()
+        self.assertEqual(data['cells'], [
+            {'worker_id': self.worker.id, 'date': self.today.isoformat(), 'value': '07:30'},
+        ])
+        self.assertNotIn(self.today.day, data['red_days'])
+
+        data = self.client.get(f'/api/schedule/{self.cafe.id}/changes', {'since': data['version']}).json()
+        self.assertEqual(data['cells'], [])
+        self.assertEqual(data['swaps'], [])
+
+    def test_changes_report_deleted_cells(self):
+        shift = Shift.objects.create(worker=self.worker, coffee_shop=self.cafe, date=self.today, start_time='07:30')
+        version = self.client.get(f'/api/schedule/{self.cafe.id}/').json()['version']
+
+        Shift.objects.filter(pk=shift.pk).delete()
+        data = self.client.get(f'/api/schedule/{self.cafe.id}/changes', {'since': version}).json()
+        self.assertEqual(data['cells'], [
+            {'worker_id': self.worker.id, 'date': self.today.isoformat(), 'value': ''},
+        ])
+        self.assertIn(self.today.day, data['red_days'])
+        self.assertGreater(data['version'], version)
+
+        data = self.client.get(f'/api/schedule/{self.cafe.id}/changes', {'since': data['version']}).json()
+        self.assertEqual(data['cells'], [])
+
+
+class ScheduleStreamTests(TestCase):
+    async def test_broker_fan_out(self):
+        broker = InProcessBroker()
+        listeners = [broker.listen('schedule:1', heartbeat=0.01) for _ in range(2)]
+        for listener in listeners:
+            self.assertIsNone(await anext(listener))
+        broker.publish('schedule:1', 'hello')
+        broker.publish('schedule:2', 'other cafe')
+        for listener in listeners:
+            self.assertEqual(await anext(listener), 'hello')
+            await listener.aclose()
+        self.assertEqual(broker._subscribers, {})
+
+    async def test_stream_delivers_events(self):
+        response = await self.async_client.get('/api/schedule/1/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        get_broker().publish('schedule:1', '{"type": "swaps"}')
+        self.assertEqual(await pending, b'data: {"type": "swaps"}\n\n')
+        await stream.aclose()
+
+    def test_update_shift_publishes_after_commit(self):
+        cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        worker = make_worker(cafe, 'Анна')
+        with mock.patch('main.pubsub.get_broker') as broker:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/swap/increment/', json.dumps({
+                    'worker_id': worker.id,
+                }), content_type='application/json')
+        today = date.today()
+        broker.return_value.publish.assert_called_once_with(f'schedule:{cafe.id}', json.dumps({
+            'type': 'swaps', 'worker_id': worker.id, 'month': f'{today.year}-{today.month:02d}', 'swaps': 1,
+        }))
+
+
+class DailyCoverageTests(TestCase):
+    def setUp(self):
+        self.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.other = CoffeeShop.objects.create(name='dz', short_code='Дз', minimum_workers=1)
+        self.worker = make_worker(self.cafe, 'Анна')
+        self.day = date(2025, 3, 3)
+
+    def counts(self):
+        return dict(DailyCoverage.objects.filter(staffed_count__gt=0).values_list('cafe_id', 'staffed_count'))
+
+    def test_tracks_saves_and_deletes(self):
+        shift = Shift.objects.create(worker=self.worker, coffee_shop=self.cafe, date=self.day, start_time='07:30')
+        self.assertEqual(self.counts(), {self.cafe.id: 1})
+
+        shift = Shift.objects.get(pk=shift.pk)
+        shift.start_time = None
+        shift.other_coffee_shop = self.other
+        shift.save()
+        self.assertEqual(self.counts(), {self.other.id: 1})
+
+        Shift.objects.only('id').get(pk=shift.pk).delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_bulk_path_and_rebuild(self):
+        self.client.post('/api/shift/bulk/', json.dumps({'edits': [
+            {'worker_id': self.worker.id, 'from': '2025-03-03', 'to': '2025-03-05', 'start_time': '08:00'},
+            {'worker_id': self.worker.id, 'date': '2025-03-04', 'other_cafe_id': self.other.id},
+        ]}), content_type='application/json')
+        expected = {(self.cafe.id, date(2025, 3, 3)), (self.other.id, date(2025, 3, 4)), (self.cafe.id, date(2025, 3, 5))}
+        staffed = set(DailyCoverage.objects.filter(staffed_count=1).values_list('cafe_id', 'date'))
+        self.assertEqual(staffed, expected)
+
+        DailyCoverage.objects.all().delete()
+        call_command('rebuild_coverage', stdout=StringIO())
+        self.assertEqual(set(DailyCoverage.objects.values_list('cafe_id', 'date')), expected)
+
+
+class ShiftQueryPlanTests(TestCase):
+    """Запросы графика не должны сканировать таблицу смен целиком даже на годах истории."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=2)
+        cls.other = CoffeeShop.objects.create(name='dz', short_code='Дз', minimum_workers=2)
+        workers = [make_worker(cafe, f'w{i}') for cafe in (cls.cafe, cls.other) for i in range(5)]
+        start = date(2023, 1, 1)
+        Shift.objects.bulk_create([
+            Shift(
+                worker=worker,
+                coffee_shop=worker.coffee_shop,
+                date=start + timedelta(days=day),
+                start_time='08:00' if (day + worker.id) % 4 else None,
+                other_coffee_shop=cls.other if worker.coffee_shop == cls.cafe and day % 9 == 0 else None,
+            )
+            for worker in workers
+            for day in range(3 * 365)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assert_no_full_scans(self, ctx):
+        for query in ctx.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plan = [row[-1] for row in cursor.fetchall()]
+            scans = [step for step in plan if step.startswith('SCAN main_')]
+            self.assertEqual(scans, [], f"{query['sql']}\n{plan}")
+
+    def test_schedule_queries_use_indexes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            build_schedule(self.cafe, 2025, 6)
+            schedule_changes(self.cafe, 2025, 6, since=0)
+            day_states(self.other, [date(2025, 6, 3), date(2025, 6, 10)])
+            refresh_coverage({(self.cafe.id, date(2025, 6, 3)), (self.other.id, date(2025, 6, 3))})
+        self.assert_no_full_scans(ctx)
+
+
+class BenchmarkToolingTests(TestCase):
+    def test_seed_schedule(self):
+        call_command('seed_schedule', cafes=2, workers=4, months=2, start='2025-01', stdout=StringIO())
+        self.assertEqual(CoffeeShop.objects.filter(short_code__startswith='S').count(), 2)
+        self.assertEqual(Worker.objects.count(), 8)
+        shifts = Shift.objects.filter(date__gte=date(2025, 1, 1), date__lte=date(2025, 2, 28))
+        self.assertEqual(shifts.count(), Shift.objects.count())
+        self.assertGreater(shifts.count(), 8 * 59 // 2)
+        self.assertTrue(DailyCoverage.objects.exists())
+
+    def test_compare_flags_regressions(self):
+        base = {'1x1x1': {'schedule_cold': {'queries': 5, 'p95_ms': 10.0, 'peak_kb': 100.0}}}
+        same = {'1x1x1': {'schedule_cold': {'queries': 5, 'p95_ms': 15.0, 'peak_kb': 100.0}}}
+        worse = {'1x1x1': {'schedule_cold': {'queries': 6, 'p95_ms': 25.0, 'peak_kb': 100.0}}}
+        self.assertEqual(compare(same, base, 2.0), ([], []))
+        regressions, drift = compare(worse, base, 2.0)
+        self.assertEqual((len(regressions), len(drift)), (1, 1))
+
+        # доли миллисекунды — шум, а не регрессия
+        tiny = {'1x1x1': {'schedule_cached': {'queries': 0, 'p95_ms': 0.852, 'peak_kb': 80.0}}}
+        noisy = {'1x1x1': {'schedule_cached': {'queries': 0, 'p95_ms': 1.856, 'peak_kb': 120.0}}}
+        slow = {'1x1x1': {'schedule_cached': {'queries': 0, 'p95_ms': 6.0, 'peak_kb': 120.0}}}
+        self.assertEqual(compare(noisy, tiny, 2.0), ([], []))
+        self.assertEqual(compare(slow, tiny, 2.0)[0], [])
+        self.assertEqual(len(compare(slow, tiny, 2.0)[1]), 1)
+
+
+@override_settings(MIDDLEWARE=['main.middleware.QueryInstrumentationMiddleware', *settings.MIDDLEWARE])
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_perf_stats()
+
+    def test_server_timing_and_report(self):
+        cafe = CoffeeShop.objects.create(name='mira', short_code='Мр')
+        make_worker(cafe, 'Анна')
+        response = self.client.get(f'/api/schedule/{cafe.id}/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="5 queries", total;dur=[\d.]+$')
+
+        self.assertEqual(self.client.get('/api/perf/').status_code, 302)
+        User.objects.create_user('boss', password='pw', is_staff=True)
+        self.client.login(username='boss', password='pw')
+        report = self.client.get('/api/perf/').json()
+        self.assertEqual(report['schedule_data']['queries_max'], 5)
+        self.assertEqual(report['schedule_data']['flagged_requests'], 0)
+
+    def test_flags_repeated_query_shapes(self):
+        cafes = [CoffeeShop.objects.create(name=f'c{i}', short_code=f'c{i}') for i in range(8)]
+
+        def n_plus_one(request):
+            for cafe in cafes:
+                CoffeeShop.objects.get(id=cafe.id)
+            return HttpResponse()
+
+        request = RequestFactory().get('/n-plus-one/')
+        with self.assertLogs('main.middleware', 'WARNING'):
+            QueryInstrumentationMiddleware(n_plus_one)(request)
+        stats = perf_report()[UNRESOLVED]
+        self.assertEqual(stats['flagged_requests'], 1)
+        self.assertEqual(list(stats['duplicate_queries'].values()), [8])
+
+    def test_unresolved_paths_share_one_entry(self):
+        for i in range(3):
+            self.assertEqual(self.client.get(f'/nope/{i}/').status_code, 404)
+        self.assertEqual(list(perf_report()), [UNRESOLVED])
+        self.assertEqual(perf_report()[UNRESOLVED]['requests'], 3)
+
+
+class ScheduleSpanTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.worker = make_worker(self.cafe, 'Анна')
+        Shift.objects.create(worker=self.worker, coffee_shop=self.cafe, date=date(2025, 1, 31), start_time='07:30')
+        Shift.objects.create(worker=self.worker, coffee_shop=self.cafe, date=date(2025, 2, 1), start_time='10:00')
+        self.url = f'/api/schedule/{self.cafe.id}/'
+
+    def test_month_parameter(self):
+        data = self.client.get(self.url, {'month': '2025-02'}).json()
+        self.assertEqual(data['current_month'], '2025-02')
+        self.assertEqual(data['rows'][0]['data'][0], '10:00')
+        self.assertEqual(self.client.get(self.url, {'month': '2025-13'}).status_code, 400)
+
+    def test_range_across_months(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(self.url, {'from': '2025-01-30', 'to': '2025-02-02'}).json()
+        self.assertEqual(len(ctx.captured_queries), 4)
+        self.assertEqual([d['date'] for d in data['header']], ['2025-01-30', '2025-01-31', '2025-02-01', '2025-02-02'])
+        self.assertEqual(data['rows'][0]['data'], ['', '07:30', '10:00', ''])
+        self.assertNotIn('swaps', data['rows'][0])
+        self.assertEqual(data['red_days'], ['2025-01-30', '2025-02-02'])
+
+        etag = self.client.get(self.url, {'from': '2025-01-30', 'to': '2025-02-02'})['ETag']
+        response = self.client.get(self.url, {'from': '2025-01-30', 'to': '2025-02-02'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_prefetch_warms_adjacent_months(self):
+        self.client.get(self.url, {'month': '2025-02', 'prefetch': 1})
+        with self.assertNumQueries(0):
+            for month in ('2025-01', '2025-03'):
+                response = self.client.get(self.url, {'month': month})
+                self.assertEqual(response['X-Schedule-Cache'], 'hit')
+
+
+class NetworkCoverageTests(TestCase):
+    def test_counts_borrowed_workers_at_host_shop(self):
+        mira = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        dz = CoffeeShop.objects.create(name='dz', short_code='Дз', minimum_workers=2)
+        for i in range(10):
+            CoffeeShop.objects.create(name=f'c{i}', short_code=f'c{i}')
+        anna = make_worker(mira, 'Анна')
+        oleg = make_worker(dz, 'Олег')
+        Shift.objects.create(worker=anna, coffee_shop=mira, date=date(2025, 2, 3), other_coffee_shop=dz)
+        Shift.objects.create(worker=oleg, coffee_shop=dz, date=date(2025, 2, 3), start_time='08:00')
+
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/network/coverage/', {'month': '2025-02'}).json()
+        self.assertEqual(data['days'], 28)
+        shops = {shop['short_code']: shop for shop in data['shops']}
+        self.assertEqual(len(shops), 12)
+        self.assertEqual(shops['Дз']['staffed'][2], 2)
+        self.assertNotIn(3, shops['Дз']['red_days'])
+        self.assertEqual(sum(shops['Мр']['staffed']), 0)
+        self.assertEqual(len(shops['Мр']['red_days']), 28)
+
+
+class SchedulerTests(TestCase):
+    def test_solver_covers_and_balances_quickly(self):
+        workers = list(range(30))
+        days = [date(2025, 1, d) for d in range(1, 32)]
+        need = {d: 12 for d in days}
+        days_off = {0: set(days[:10])}
+        started = time.perf_counter()
+        plan, hours, unfilled = solve(workers, days, need, days_off=days_off, max_shifts={1: 5})
+        self.assertLess(time.perf_counter() - started, 1.0)
+
+        self.assertEqual(unfilled, [])
+        for d in days:
+            self.assertEqual(sum(1 for (w, day) in plan if day == d), 12)
+        self.assertFalse(any(w == 0 and day in days_off[0] for (w, day) in plan))
+        self.assertEqual(sum(1 for (w, _) in plan if w == 1), 5)
+        balanced = [h for w, h in hours.items() if w != 1]
+        self.assertLessEqual(max(balanced) - min(balanced), 14.5)
+
+    def test_generate_endpoint_fills_month_around_fixed_cells(self):
+        cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=2)
+        workers = [make_worker(cafe, f'w{i}') for i in range(4)]
+        Shift.objects.create(worker=workers[0], coffee_shop=cafe, date=date(2025, 2, 1), start_time='07:30')
+        Shift.objects.create(worker=workers[1], coffee_shop=cafe, date=date(2025, 2, 2))
+
+        response = self.client.post(f'/api/schedule/{cafe.id}/generate/', json.dumps({
+            'month': '2025-02',
+            'constraints': {str(workers[2].id): {'days_off': ['2025-02-03']}},
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['unfilled'], [])
+        self.assertEqual(response.json()['assignments'], 2 * 28 - 1)
+
+        self.assertEqual(DailyCoverage.objects.filter(cafe=cafe, staffed_count=2).count(), 28)
+        self.assertIsNone(Shift.objects.get(worker=workers[1], date=date(2025, 2, 2)).start_time)
+        self.assertFalse(Shift.objects.filter(worker=workers[2], date=date(2025, 2, 3)).exists())
+
+    def test_lent_days_count_hours_like_payroll(self):
+        from .scheduler import generate_month
+
+        cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        dz = CoffeeShop.objects.create(name='dz', short_code='Дз', minimum_workers=0)
+        lent, home = make_worker(cafe, 'Анна'), make_worker(cafe, 'Олег')
+        for day in range(1, 11):
+            Shift.objects.create(worker=lent, coffee_shop=cafe, date=date(2025, 2, day), other_coffee_shop=dz)
+
+        edits, hours, _ = generate_month(cafe, 2025, 2)
+        apply_edits(edits)
+        paid = {}
+        for row in payroll_rows(date(2025, 2, 1), date(2025, 2, 28), None):
+            paid[row['worker_id']] = paid.get(row['worker_id'], 0) + row['hours']
+        # часы балансировки — те же, за которые платят, включая подработку
+        self.assertEqual(hours, paid)
+        self.assertLessEqual(abs(hours[lent.id] - hours[home.id]), 14.5)
+
+
+class PayrollTests(TestCase):
+    def test_hours_and_pay_per_worker_cafe_and_month(self):
+        mira = CoffeeShop.objects.create(name='mira', short_code='Мр')
+        dz = CoffeeShop.objects.create(name='dz', short_code='Дз')
+        anna = make_worker(mira, 'Анна')
+        oleg = make_worker(dz, 'Олег')
+        oleg.hourly_rate = 250
+        oleg.save()
+        for day in (3, 4):
+            Shift.objects.create(worker=anna, coffee_shop=mira, date=date(2025, 2, day), start_time='07:30')
+        Shift.objects.create(worker=anna, coffee_shop=mira, date=date(2025, 2, 5), other_coffee_shop=dz)
+        Shift.objects.create(worker=anna, coffee_shop=mira, date=date(2025, 2, 6), display_value='+')
+        Shift.objects.create(worker=oleg, coffee_shop=dz, date=date(2025, 2, 3), start_time='10:00')
+        Shift.objects.create(worker=anna, coffee_shop=mira, date=date(2025, 3, 1), start_time='10:00')
+
+        with self.assertNumQueries(3):
+            data = self.client.get('/api/payroll/', {'month': '2025-02'}).json()
+        rows = {(row['worker'], row['cafe']): row for row in data['rows']}
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows['Анна', 'mira']['shifts'], 2)
+        self.assertEqual(rows['Анна', 'mira']['hours'], 29.0)
+        self.assertEqual(rows['Анна', 'mira']['pay'], 8700)
+        self.assertEqual(rows['Анна', 'dz']['hours'], 14.0)
+        self.assertEqual(rows['Олег', 'dz']['pay'], 3000)
+        shops = {shop['name']: shop for shop in data['shops']}
+        self.assertEqual(shops['dz']['pay'], 14 * 300 + 3000)
+
+        data = self.client.get('/api/payroll/', {'from': '2025-02-01', 'to': '2025-03-31', 'cafe': mira.id}).json()
+        self.assertEqual([row['month'] for row in data['rows']], ['2025-02', '2025-03'])
+        self.assertEqual(data['workers'][0]['hours'], 29.0 + 12.0)
+
+        out = StringIO()
+        call_command('payroll_report', month='2025-02', stdout=out)
+        self.assertIn('Анна', out.getvalue())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.mira = CoffeeShop.objects.create(name='mira', short_code='Мр')
+        self.dz = CoffeeShop.objects.create(name='dz', short_code='Дз')
+        self.anna = make_worker(self.mira, 'Анна')
+        self.oleg = make_worker(self.dz, 'Олег')
+        Shift.objects.create(worker=self.anna, coffee_shop=self.mira, date=date(2025, 2, 3), start_time='07:30')
+        Shift.objects.create(worker=self.anna, coffee_shop=self.mira, date=date(2025, 3, 1), other_coffee_shop=self.dz)
+        Shift.objects.create(worker=self.oleg, coffee_shop=self.dz, date=date(2025, 2, 28), display_value='+')
+
+    def test_schedule_csv_streams_grid_rows(self):
+        response = self.client.get('/api/export/schedule/', {'from': '2025-02-01', 'to': '2025-03-31'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        rows = [line.split(',') for line in lines]
+        self.assertEqual(rows[0][:4], ['Точка', 'Работник', 'Месяц', '1'])
+        self.assertEqual(len(rows), 1 + 2 * 2)
+        by_key = {(row[1], row[2]): row[3:] for row in rows[1:]}
+        self.assertEqual(by_key['Анна', '2025-02'][2], '07:30')
+        self.assertEqual(by_key['Анна', '2025-03'][0], '+ Дз')
+        self.assertEqual(by_key['Олег', '2025-02'][27], '+')
+        self.assertEqual(by_key['Олег', '2025-02'][28], '')
+
+    async def test_schedule_csv_streams_asynchronously_under_asgi(self):
+        response = await self.async_client.get('/api/export/schedule/', {'from': '2025-02-01', 'to': '2025-03-31'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8-sig')
+        self.assertEqual(len(body.splitlines()), 1 + 2 * 2)
+        self.assertIn('07:30', body)
+
+    def test_payroll_xlsx_is_a_readable_workbook(self):
+        import zipfile
+
+        response = self.client.get('/api/export/payroll/', {'month': '2025-02', 'format': 'xlsx'})
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertIn('xl/workbook.xml', archive.namelist())
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('<t>Анна</t>', sheet)
+        self.assertIn('<v>14.5</v>', sheet)
+
+        self.assertEqual(self.client.get('/api/export/payroll/', {'format': 'pdf'}).status_code, 400)
+
+
+class ScheduleImportTests(TestCase):
+    def setUp(self):
+        self.mira = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.dz = CoffeeShop.objects.create(name='dz', short_code='Дз')
+        self.anna = make_worker(self.mira, 'Анна')
+        self.ivan = make_worker(self.mira, 'Иван')
+        self.oleg = make_worker(self.dz, 'Олег')
+        Shift.objects.create(worker=self.ivan, coffee_shop=self.mira, date=date(2025, 2, 3), start_time='10:00')
+
+    def test_endpoint_upserts_valid_rows_and_reports_errors(self):
+        body = '\n'.join([
+            'worker;date;value',
+            'Анна;2025-02-03;07:30',
+            f'{self.ivan.id};2025-02-03;',
+            'Анна;2025-02-04;+ Дз',
+            'Анна;2025-02-05;+',
+            'Анна;2025-02-03;08:00',
+            'Олег;2025-02-03;08:00',
+            'Пётр;2025-02-03;08:00',
+            'Иван;2025-02-04;+ Хх',
+            'Иван;2025-02-31;08:00',
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/schedule/import/?cafe={self.mira.id}', body, content_type='text/csv',
+            )
+        data = response.json()
+        self.assertEqual(data['cells'], 4)
+        self.assertEqual(data['changed'], 4)
+        self.assertEqual([e['line'] for e in data['errors']], [6, 7, 8, 9, 10])
+        self.assertIn('другой точке', data['errors'][1]['error'])
+
+        self.assertEqual(Shift.objects.get(worker=self.anna, date=date(2025, 2, 3)).start_time, '07:30')
+        self.assertIsNone(Shift.objects.get(worker=self.ivan, date=date(2025, 2, 3)).start_time)
+        self.assertEqual(Shift.objects.get(worker=self.anna, date=date(2025, 2, 4)).other_coffee_shop, self.dz)
+        self.assertEqual(DailyCoverage.objects.get(cafe=self.dz, date=date(2025, 2, 4)).staffed_count, 1)
+        self.assertEqual(DailyCoverage.objects.get(cafe=self.mira, date=date(2025, 2, 3)).staffed_count, 1)
+
+    def test_lent_cell_from_the_grid_round_trips(self):
+        self.client.post('/api/shift/update/', json.dumps({
+            'worker_id': self.anna.id, 'date': '2025-02-06', 'other_cafe_id': self.dz.id, 'display_value': 'Дз',
+        }), content_type='application/json')
+        response = self.client.get('/api/export/schedule/', {'month': '2025-02', 'cafe': self.mira.id})
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        exported = next(row for row in csv.reader(lines) if row[1] == 'Анна')[3 + 5]
+        self.assertEqual(exported, 'Дз')
+
+        Shift.objects.filter(worker=self.anna).delete()
+        data = import_schedule(['worker,date,value', f'Анна,2025-02-06,{exported}'], self.mira)
+        self.assertEqual(data['errors'], [])
+        shift = Shift.objects.get(worker=self.anna, date=date(2025, 2, 6))
+        self.assertEqual((shift.other_coffee_shop, shift.display_value), (self.dz, 'Дз'))
+
+    @override_settings(ARCHIVE_KEEP_MONTHS=3)
+    def test_closed_months_and_conflicts_are_row_errors(self):
+        today = date.today()
+        data = import_schedule([
+            'worker,date,value',
+            f'Анна,{today},08:00',
+            f'Анна,{today + timedelta(days=1)},+ Мр',
+            'Анна,2020-01-08,08:00',
+        ], self.mira)
+        self.assertEqual([e['line'] for e in data['errors']], [3, 4])
+        self.assertIn('собственной точке', data['errors'][0]['error'])
+        self.assertIn('закрыты', data['errors'][1]['error'])
+        self.assertEqual(data['changed'], 1)
+        self.assertEqual(Shift.objects.get(worker=self.anna, date=today).start_time, '08:00')
+
+    def test_command_imports_thousands_of_cells_quickly(self):
+        import os
+        import tempfile
+
+        workers = [make_worker(self.mira, f'w{i}') for i in range(30)]
+        lines = ['worker,date,value']
+        for worker in workers:
+            for day in range(365):
+                lines.append(f"{worker.id},{date(2025, 1, 1) + timedelta(days=day)},08:00")
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        self.addCleanup(os.unlink, f.name)
+
+        started = time.perf_counter()
+        out = StringIO()
+        call_command('import_schedule', f.name, cafe='Мр', stdout=out)
+        self.assertLess(time.perf_counter() - started, 10)
+        self.assertEqual(Shift.objects.filter(worker__in=workers).count(), 30 * 365)
+        self.assertIn('ошибок 0', out.getvalue())
+
+
+class SwapCounterTests(TransactionTestCase):
+    def setUp(self):
+        self.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр')
+        self.worker = make_worker(self.cafe, 'Анна')
+
+    def test_counters_are_per_month(self):
+        SwapCounter.objects.create(worker=self.worker, month=date(2025, 1, 1), swaps_this_month=4)
+        self.assertEqual(increment_swaps(self.worker.id, date(2025, 2, 1)), 1)
+        self.assertEqual(increment_swaps(self.worker.id, date(2025, 2, 1)), 2)
+        self.assertEqual(SwapCounter.objects.get(worker=self.worker, month=date(2025, 1, 1)).swaps_this_month, 4)
+
+    def test_schedule_get_never_writes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f'/api/schedule/{self.cafe.id}/', {'month': '2025-02'})
+        self.assertFalse([q for q in ctx.captured_queries if not q['sql'].startswith('SELECT')])
+        self.assertFalse(SwapCounter.objects.exists())
+
+    def test_parallel_increments_are_not_lost(self):
+        month = date(2025, 2, 1)
+        threads, per_thread = 8, 10
+        barrier = threading.Barrier(threads)
+        errors = []
+
+        def click():
+            try:
+                barrier.wait()
+                for _ in range(per_thread):
+                    increment_swaps(self.worker.id, month)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=click) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(SwapCounter.objects.get(worker=self.worker, month=month).swaps_this_month, threads * per_thread)
+
+
+class ConflictTests(TestCase):
+    def setUp(self):
+        self.mira = CoffeeShop.objects.create(name='mira', short_code='Мр')
+        self.dz = CoffeeShop.objects.create(name='dz', short_code='Дз')
+        self.anna = make_worker(self.mira, 'Анна')
+        self.oleg = make_worker(self.dz, 'Олег')
+
+    def test_conflicting_edits_are_rejected(self):
+        for payload in (
+            {'worker_id': self.anna.id, 'date': '2025-02-03', 'start_time': '08:00', 'other_cafe_id': self.dz.id},
+            {'worker_id': self.anna.id, 'date': '2025-02-03', 'other_cafe_id': self.mira.id},
+        ):
+            response = self.client.post('/api/shift/update/', json.dumps(payload), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/shift/bulk/', json.dumps({'edits': [
+            {'worker_id': self.oleg.id, 'date': '2025-02-03', 'start_time': '08:00'},
+            {'worker_id': self.anna.id, 'from': '2025-02-01', 'to': '2025-02-07', 'other_cafe_id': self.mira.id},
+        ]}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Shift.objects.exists())
+
+    def test_month_report_and_borrowed_listing(self):
+        Shift.objects.create(worker=self.anna, coffee_shop=self.mira, date=date(2025, 2, 3),
+                             start_time='08:00', other_coffee_shop=self.dz)
+        Shift.objects.create(worker=self.anna, coffee_shop=self.mira, date=date(2025, 2, 4), other_coffee_shop=self.mira)
+        Shift.objects.create(worker=self.oleg, coffee_shop=self.mira, date=date(2025, 2, 5), start_time='10:00')
+        Shift.objects.create(worker=self.oleg, coffee_shop=self.dz, date=date(2025, 2, 3), other_coffee_shop=self.mira)
+        Shift.objects.create(worker=self.oleg, coffee_shop=self.dz, date=date(2025, 3, 4), start_time='08:00',
+                             other_coffee_shop=self.mira)
+
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/network/conflicts/', {'month': '2025-02'}).json()
+        self.assertEqual(
+            [(c['date'], c['kind']) for c in data['conflicts']],
+            [('2025-02-03', 'double_booked'), ('2025-02-04', 'self_lent'), ('2025-02-05', 'wrong_cafe')],
+        )
+
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/network/borrowed/', {'date': '2025-02-03'}).json()
+        self.assertEqual([(b['worker'], b['from'], b['to']) for b in data['borrowed']],
+                         [('Олег', 'Дз', 'Мр'), ('Анна', 'Мр', 'Дз')])
+
+
+class StubTransport:
+    """Транспорт для тестов: складывает уведомления в sent."""
+
+    sent = []
+
+    def send(self, alert):
+        self.sent.append(alert)
+
+
+@override_settings(NOTIFICATION_TRANSPORT='main.tests.StubTransport')
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        reset_transport()
+        StubTransport.sent = []
+        self.addCleanup(reset_transport)
+        self.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.anna = make_worker(self.cafe, 'Анна')
+
+    def edit(self, start_time):
+        self.client.post('/api/shift/update/', json.dumps({
+            'worker_id': self.anna.id, 'date': '2025-02-03', 'start_time': start_time,
+        }), content_type='application/json')
+
+    def test_edits_only_write_the_outbox(self):
+        with mock.patch.object(StubTransport, 'send', side_effect=AssertionError('send on request path')):
+            self.edit('08:00')
+            self.edit(None)
+        self.assertEqual(StaffingNotification.objects.filter(processed_at__isnull=True).count(), 2)
+
+    def test_drain_coalesces_and_debounces(self):
+        self.edit(None)
+        self.edit('08:00')
+        self.edit(None)
+        later = timezone.now() + timedelta(seconds=120)
+
+        self.assertEqual(drain_outbox(now=timezone.now(), debounce=60), 0)
+        self.assertEqual(drain_outbox(now=later, debounce=60), 1)
+        self.assertEqual([a['understaffed'] for a in StubTransport.sent], [True])
+        self.assertEqual(StaffingNotification.objects.count(), 1)
+
+        # флаппинг вокруг уже отправленного состояния ничего не шлёт
+        self.edit('08:00')
+        self.edit(None)
+        self.assertEqual(drain_outbox(now=later + timedelta(seconds=120), debounce=60), 0)
+
+        self.edit('10:00')
+        call_command('drain_notifications', debounce=0, stdout=StringIO())
+        self.assertEqual([a['understaffed'] for a in StubTransport.sent], [True, False])
+        self.assertFalse(StaffingNotification.objects.filter(processed_at__isnull=True).exists())
+
+    def test_batch_takes_whole_days(self):
+        other = make_worker(self.cafe, 'Олег')
+        self.edit('08:00')
+        self.client.post('/api/shift/update/', json.dumps({
+            'worker_id': other.id, 'date': '2025-02-04', 'start_time': '08:00',
+        }), content_type='application/json')
+        self.edit(None)
+        later = timezone.now() + timedelta(seconds=120)
+
+        # первый день — две строки; batch=1 берёт их обе, а не только первую
+        self.assertEqual(drain_outbox(now=later, debounce=60, batch=1), 1)
+        self.assertEqual([(a['date'], a['understaffed']) for a in StubTransport.sent], [('2025-02-03', True)])
+        self.assertEqual(drain_outbox(now=later, debounce=60, batch=1), 0)
+        self.assertFalse(StaffingNotification.objects.filter(processed_at__isnull=True).exists())
+
+
+class SQLiteTuningTests(TransactionTestCase):
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_parallel_edits_without_lock_errors(self):
+        seed_schedule(2, 5, 1, rng=random.Random(0))
+        result = write_load(threads=6, per_thread=15)
+        self.assertEqual(result['locked'], 0)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(result['writes'] + result['reads'], 6 * 15)
+
+    def test_parallel_edits_of_one_cell_keep_the_journal_chain(self):
+        cafe = CoffeeShop.objects.create(name='mira', short_code='Мр')
+        worker = make_worker(cafe, 'Анна')
+        times = [value for value, _ in Shift.SHIFT_TIMES]
+        barrier = threading.Barrier(4)
+        errors = []
+
+        def edit(n):
+            try:
+                barrier.wait()
+                for i in range(10):
+                    apply_edits([{'worker_id': worker.id, 'date': '2025-02-03', 'start_time': times[(n + i) % 3]}])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=edit, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        # каждая запись журнала начинается с того, чем закончилась предыдущая
+        chain = list(ShiftChange.objects.filter(worker=worker).order_by('id').values_list('old_value', 'new_value'))
+        self.assertIsNone(chain[0][0])
+        for (_, previous), (old, _) in zip(chain, chain[1:]):
+            self.assertEqual(old, previous)
+        self.assertEqual(Shift.objects.get(worker=worker).start_time, chain[-1][1]['start_time'])
+
+
+class ShiftAdminTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(self.user)
+        self.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.dz = CoffeeShop.objects.create(name='dz', short_code='Дз')
+        self.workers = [make_worker(self.cafe, f'w{i}') for i in range(5)]
+        for worker in self.workers:
+            for day in range(3, 10):
+                Shift.objects.create(worker=worker, coffee_shop=self.cafe, date=date(2025, 2, day), start_time='08:00')
+        Shift.objects.create(worker=self.workers[0], coffee_shop=self.cafe, date=date(2025, 2, 10),
+                             other_coffee_shop=self.dz)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        url = '/admin/main/shift/'
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get(url, {'coffee_shop__id__exact': self.cafe.id}).status_code, 200)
+        for worker in self.workers:
+            for day in range(10, 28):
+                Shift.objects.get_or_create(worker=worker, date=date(2025, 2, day),
+                                            defaults={'coffee_shop': self.cafe, 'start_time': '10:00'})
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.client.get(url, {'coffee_shop__id__exact': self.cafe.id}).status_code, 200)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(self.client.get('/admin/main/swapcounter/').status_code, 200)
+
+    def test_change_form_bumps_old_place_and_checks_conflicts(self):
+        shift = Shift.objects.get(worker=self.workers[0], date=date(2025, 2, 10))
+        url = f'/admin/main/shift/{shift.id}/change/'
+        form = {
+            'worker': self.workers[0].id, 'coffee_shop': self.cafe.id, 'date': '2025-03-10',
+            'start_time': '', 'other_coffee_shop': self.dz.id, 'display_value': '',
+        }
+        etags = {
+            cafe.id: self.client.get(f'/api/schedule/{cafe.id}/', {'month': '2025-02'})['ETag']
+            for cafe in (self.cafe, self.dz)
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(url, form).status_code, 302)
+        for cafe_id, etag in etags.items():
+            response = self.client.get(f'/api/schedule/{cafe_id}/', {'month': '2025-02'}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(url, {**form, 'start_time': '08:00'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'подработка в один день')
+        response = self.client.post(url, {**form, 'other_coffee_shop': '', 'coffee_shop': self.dz.id})
+        self.assertEqual(response.status_code, 200)
+        shift.refresh_from_db()
+        self.assertEqual((shift.date, shift.coffee_shop_id), (date(2025, 3, 10), self.cafe.id))
+
+    def test_estimated_count_for_unfiltered_list(self):
+        from .admin import EstimatedCountPaginator
+
+        paginator = EstimatedCountPaginator(Shift.objects.all(), 100)
+        with mock.patch('main.admin.ESTIMATE_COUNT_FROM', 0), mock.patch('main.admin.estimated_count', return_value=10 ** 6):
+            self.assertEqual(paginator.count, 10 ** 6)
+        filtered = EstimatedCountPaginator(Shift.objects.filter(coffee_shop=self.cafe), 100)
+        self.assertEqual(filtered.count, 36)
+
+    def test_copy_week_and_clear_month_actions(self):
+        week = Shift.objects.filter(date__gte=date(2025, 2, 3), date__lte=date(2025, 2, 9))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/main/shift/', {
+                'action': 'copy_to_next_week',
+                '_selected_action': list(week.values_list('id', flat=True)),
+            })
+        self.assertEqual(Shift.objects.filter(date__gte=date(2025, 2, 10), date__lte=date(2025, 2, 16),
+                                              start_time='08:00').count(), 35)
+        self.assertEqual(DailyCoverage.objects.get(cafe=self.cafe, date=date(2025, 2, 10)).staffed_count, 5)
+        self.assertEqual(DailyCoverage.objects.get(cafe=self.dz, date=date(2025, 2, 10)).staffed_count, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/main/shift/', {
+                'action': 'clear_months',
+                '_selected_action': [week.first().id],
+            })
+        self.assertFalse(Shift.objects.filter(start_time__isnull=False).exists())
+        self.assertFalse(DailyCoverage.objects.filter(staffed_count__gt=0).exists())
+
+
+@override_settings(ARCHIVE_KEEP_MONTHS=3)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.mira = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.dz = CoffeeShop.objects.create(name='dz', short_code='Дз', minimum_workers=1)
+        self.anna = make_worker(self.mira, 'Анна')
+        self.oleg = make_worker(self.dz, 'Олег')
+        for day in range(1, 29, 2):
+            for month in (1, 2):
+                Shift.objects.create(worker=self.anna, coffee_shop=self.mira, date=date(2025, month, day),
+                                     start_time=['07:30', '10:00'][day % 4 == 1])
+        Shift.objects.create(worker=self.oleg, coffee_shop=self.dz, date=date(2025, 2, 4), other_coffee_shop=self.mira)
+        Shift.objects.create(worker=self.oleg, coffee_shop=self.dz, date=date(2025, 2, 5), display_value='+')
+        SwapCounter.objects.create(worker=self.anna, month=date(2025, 2, 1), swaps_this_month=2)
+        self.today = date.today()
+        Shift.objects.create(worker=self.anna, coffee_shop=self.mira, date=self.today, start_time='08:00')
+
+    def snapshot(self):
+        grid = self.client.get(f'/api/schedule/{self.mira.id}/', {'month': '2025-02'}).json()
+        payroll = [
+            self.client.get('/api/payroll/', params).json()['rows']
+            for params in ({'from': '2025-01-01', 'to': '2025-02-28'}, {'from': '2025-01-15', 'to': '2025-02-10'},
+                           {'month': '2025-02', 'cafe': self.mira.id})
+        ]
+        return [row['data'] for row in grid['rows']], grid['red_days'], [r['swaps'] for r in grid['rows']], payroll
+
+    def test_archived_months_survive_export_and_coverage_rebuild(self):
+        from .coverage import rebuild_coverage
+
+        def export():
+            response = self.client.get('/api/export/schedule/', {'month': '2025-02', 'cafe': self.mira.id})
+            lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+            return lines[1:]
+
+        before = export()
+        covered = DailyCoverage.objects.filter(date__lt=date(2025, 3, 1)).count()
+        call_command('archive_shifts', stdout=StringIO())
+        self.assertEqual(export(), before)
+        self.assertIn('07:30', before[0])
+
+        rebuild_coverage()
+        self.assertEqual(DailyCoverage.objects.filter(date__lt=date(2025, 3, 1)).count(), covered)
+
+    def test_archive_moves_rows_and_keeps_history(self):
+        before = self.snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_shifts', stdout=StringIO())
+
+        self.assertEqual(list(Shift.objects.values_list('date', flat=True)), [self.today])
+        self.assertEqual(ShiftArchive.objects.count(), 30)
+        anna = WorkerMonthSummary.objects.get(worker=self.anna, month=date(2025, 2, 1))
+        self.assertEqual(anna.by_start_time, {'07:30': 7, '10:00': 7})
+        self.assertEqual(anna.swaps, 2)
+        oleg = WorkerMonthSummary.objects.get(worker=self.oleg, month=date(2025, 2, 1))
+        self.assertEqual((oleg.lent, oleg.plus_days), ({str(self.mira.id): 1}, 1))
+        dz = CafeMonthSummary.objects.get(cafe=self.dz, month=date(2025, 2, 1))
+        self.assertEqual((dz.lent_days, dz.understaffed_days), (1, 28))
+        self.assertEqual(CafeMonthSummary.objects.get(cafe=self.mira, month=date(2025, 2, 1)).borrowed_days, 1)
+
+        self.assertEqual(self.snapshot(), before)
+        history = self.client.get('/api/network/history/', {'from': '2025-01-01', 'to': '2025-03-31'}).json()
+        self.assertEqual(len(history['months']), 4)
+
+        response = self.client.post('/api/shift/update/', json.dumps({
+            'worker_id': self.anna.id, 'date': '2025-02-03', 'start_time': '08:00',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        call_command('archive_shifts', stdout=StringIO())
+        self.assertEqual(ShiftArchive.objects.count(), 30)
+
+
+class OfflineQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cafe = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.worker = make_worker(self.cafe, 'Анна')
+
+    def post(self, url, payload, key):
+        return self.client.post(url, json.dumps(payload), content_type='application/json',
+                                headers={'Idempotency-Key': key})
+
+    def test_replayed_key_is_applied_once(self):
+        first = self.post('/api/swap/increment/', {'worker_id': self.worker.id}, 'k-1')
+        again = self.post('/api/swap/increment/', {'worker_id': self.worker.id}, 'k-1')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again['Idempotent-Replayed'], 'true')
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(SwapCounter.objects.get(worker=self.worker).swaps_this_month, 1)
+
+        other = self.post('/api/shift/update/', {'worker_id': self.worker.id, 'date': '2025-02-03'}, 'k-1')
+        self.assertEqual(other.status_code, 422)
+
+    def test_queued_swap_keeps_its_month(self):
+        response = self.post('/api/swap/increment/', {'worker_id': self.worker.id, 'month': '2025-02'}, 'k-3')
+        self.assertEqual(response.json()['month'], '2025-02')
+        self.assertEqual(SwapCounter.objects.get(worker=self.worker, month=date(2025, 2, 1)).swaps_this_month, 1)
+
+    def test_old_keys_are_pruned(self):
+        self.post('/api/swap/increment/', {'worker_id': self.worker.id}, 'k-2')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=30))
+        call_command('prune_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_rejected_request_frees_its_key(self):
+        rejected = self.post('/api/swap/increment/', {'worker_id': 0}, 'k-4')
+        self.assertEqual(rejected.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.filter(key='k-4').exists())
+
+        retried = self.post('/api/swap/increment/', {'worker_id': self.worker.id}, 'k-4')
+        self.assertEqual(retried.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', retried)
+        self.assertEqual(SwapCounter.objects.get(worker=self.worker).swaps_this_month, 1)
+
+    def test_service_worker_is_served_from_root(self):
+        response = self.client.get('/sw.js')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/javascript')
+        self.assertEqual(response['Service-Worker-Allowed'], '/')
+        self.assertIn('/static/bootstrap/css/bootstrap.min.css', response.content.decode())
+
+
+class CompactScheduleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.mira = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=2)
+        self.dz = CoffeeShop.objects.create(name='dz', short_code='Дз', minimum_workers=1)
+        self.workers = [make_worker(self.mira, f'Работник {i}') for i in range(60)]
+        for i, worker in enumerate(self.workers):
+            for day in range(1, 29):
+                if (i + day) % 3 == 0 and day != 5:
+                    Shift.objects.create(worker=worker, coffee_shop=self.mira, date=date(2025, 2, day),
+                                         start_time=['07:30', '10:00'][day % 2])
+            Shift.objects.create(worker=worker, coffee_shop=self.mira, date=date(2025, 2, 5), other_coffee_shop=self.dz)
+        self.url = f'/api/schedule/{self.mira.id}/'
+
+    def decode(self, compact):
+        start = date.fromisoformat(compact['start'])
+        mask = int(compact['red_days'], 16)
+        dates = [start + timedelta(days=i) for i in range(compact['days'])]
+        rows = [[compact['values'][i] for i in row['cells']] for row in compact['rows']]
+        return dates, [d for i, d in enumerate(dates) if mask >> i & 1], rows
+
+    def test_compact_matches_verbose(self):
+        for params in ({'month': '2025-02'}, {'from': '2025-01-25', 'to': '2025-02-10'}):
+            verbose = self.client.get(self.url, params).json()
+            compact = self.client.get(self.url, {**params, 'format': 'compact'}).json()
+            dates, red, rows = self.decode(compact)
+            self.assertEqual([d.isoformat() for d in dates], [day['date'] for day in verbose['header']])
+            if 'month' in params:
+                self.assertEqual([d.day for d in red], verbose['red_days'])
+            else:
+                self.assertEqual([d.isoformat() for d in red], verbose['red_days'])
+            self.assertEqual(rows, [row['data'] for row in verbose['rows']])
+            self.assertEqual(compact['values'][0], '')
+            self.assertIn('+ Дз', compact['values'])
+            self.assertEqual(compact['version'], verbose['version'])
+
+        self.assertEqual(self.client.get(self.url, {'format': 'xml'}).status_code, 400)
+
+    def test_compact_is_gzipped_and_smaller(self):
+        params = {'month': '2025-02'}
+        verbose = self.client.get(self.url, params)
+        compact = self.client.get(self.url, {**params, 'format': 'compact'}, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compact['Content-Encoding'], 'gzip')
+        self.assertLess(len(compact.content) * 10, len(verbose.content))
+        self.assertNotEqual(compact['ETag'].removeprefix('W/'), verbose['ETag'])
+
+
+class ShiftChangeJournalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.mira = CoffeeShop.objects.create(name='mira', short_code='Мр', minimum_workers=1)
+        self.dz = CoffeeShop.objects.create(name='dz', short_code='Дз', minimum_workers=1)
+        self.anna = make_worker(self.mira, 'Анна')
+        self.oleg = make_worker(self.dz, 'Олег')
+
+    def post(self, url, payload):
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_edits_and_swaps_are_journaled(self):
+        self.post('/api/shift/update/', {'worker_id': self.anna.id, 'date': '2025-02-03', 'start_time': '07:30'})
+        self.post('/api/shift/update/', {'worker_id': self.anna.id, 'date': '2025-02-03', 'other_cafe_id': self.dz.id})
+        self.post('/api/swap/increment/', {'worker_id': self.anna.id})
+        self.post('/api/swap/increment/', {'worker_id': self.anna.id})
+
+        changes = list(ShiftChange.objects.order_by('id').values_list('kind', 'old_value', 'new_value', 'source'))
+        cell = {'start_time': '07:30', 'other_cafe_id': None, 'display_value': None}
+        self.assertEqual(changes, [
+            ('shift', None, cell, 'api'),
+            ('shift', cell, {'start_time': None, 'other_cafe_id': self.dz.id, 'display_value': None}, 'api'),
+            ('swaps', None, {'swaps': 1}, 'api'),
+            ('swaps', {'swaps': 1}, {'swaps': 2}, 'api'),
+        ])
+
+    def test_bulk_edit_is_journaled_in_one_insert(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.post('/api/shift/bulk/', {'edits': [
+                {'worker_id': self.anna.id, 'from': '2025-02-01', 'to': '2025-02-28', 'start_time': '08:00'},
+                {'worker_id': self.oleg.id, 'from': '2025-02-01', 'to': '2025-02-28', 'start_time': '10:00'},
+            ]})
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "main_shiftchange"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(ShiftChange.objects.filter(source='bulk').count(), 56)
+
+        # повтор тех же значений ничего не меняет и в журнал не пишется
+        self.post('/api/shift/bulk/', {'edits': [
+            {'worker_id': self.anna.id, 'from': '2025-02-01', 'to': '2025-02-28', 'start_time': '08:00'},
+        ]})
+        self.assertEqual(ShiftChange.objects.count(), 56)
+
+    def test_history_api_filters_and_pages(self):
+        self.post('/api/shift/bulk/', {'edits': [
+            {'worker_id': self.anna.id, 'from': '2025-01-20', 'to': '2025-02-10', 'start_time': '08:00'},
+            {'worker_id': self.oleg.id, 'from': '2025-02-01', 'to': '2025-02-10', 'display_value': '+'},
+        ]})
+        params = {'worker': self.anna.id, 'from': '2025-02-01', 'to': '2025-02-28', 'limit': 4}
+        pages, after = [], 0
+        while after is not None:
+            page = self.client.get('/api/changes/', {**params, 'after': after}).json()
+            pages.append(page['changes'])
+            after = page['next']
+        dates = [c['date'] for page in pages for c in page]
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(dates, [f'2025-02-{day:02d}' for day in range(1, 11)])
+
+        cafe = self.client.get('/api/changes/', {'cafe': self.dz.id}).json()['changes']
+        self.assertEqual({c['worker_id'] for c in cafe}, {self.oleg.id})
+        self.assertEqual(self.client.get('/api/changes/').status_code, 400)
+
+    def test_history_queries_use_indexes(self):
+        ShiftChange.objects.bulk_create([
+            ShiftChange(kind=ShiftChange.SHIFT, worker=worker, cafe=worker.coffee_shop,
+                        date=date(2023, 1, 1) + timedelta(days=day), new_value={}, source='api')
+            for worker in (self.anna, self.oleg)
+            for day in range(1000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/changes/', {'worker': self.anna.id, 'from': '2025-02-01', 'to': '2025-02-28'})
+            self.client.get('/api/changes/', {'cafe': self.dz.id, 'from': '2025-02-01', 'to': '2025-02-28'})
+        for query in ctx.captured_queries:
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plan = [row[-1] for row in cursor.fetchall()]
+            self.assertIn('USING INDEX', ' '.join(plan), plan)
+            self.assertEqual([step for step in plan if step.startswith('SCAN main_shiftchange')], [], plan)
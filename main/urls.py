@@ -3,9 +3,24 @@ from . import views
 
 urlpatterns = [
     path('schedule/<int:cafe_id>/', views.schedule_view, name='schedule'),
+    path('api/schedule/import/', views.import_schedule_csv, name='import_schedule'),
     path('api/schedule/<int:cafe_id>/', views.get_schedule_data, name='schedule_data'),
+    path('api/schedule/<int:cafe_id>/changes', views.get_schedule_changes, name='schedule_changes'),
+    path('api/schedule/<int:cafe_id>/stream/', views.schedule_stream, name='schedule_stream'),
+    path('api/schedule/<int:cafe_id>/generate/', views.generate_schedule, name='generate_schedule'),
     path('api/shift/update/', views.update_shift, name='update_shift'),
+    path('api/shift/bulk/', views.bulk_update_shifts, name='bulk_update_shifts'),
     path('api/swap/increment/', views.increment_swap, name='increment_swap'),
     path('api/coffee-shops/', views.get_coffee_shops, name='coffee_shops'),
+    path('api/network/coverage/', views.get_network_coverage, name='network_coverage'),
+    path('api/network/conflicts/', views.get_network_conflicts, name='network_conflicts'),
+    path('api/network/borrowed/', views.get_borrowed, name='network_borrowed'),
+    path('api/network/history/', views.get_network_history, name='network_history'),
+    path('api/changes/', views.get_change_history, name='change_history'),
+    path('api/payroll/', views.get_payroll, name='payroll'),
+    path('api/export/schedule/', views.export_schedule, name='export_schedule'),
+    path('api/export/payroll/', views.export_payroll, name='export_payroll'),
+    path('api/perf/', views.get_perf_report, name='perf_report'),
+    path('sw.js', views.service_worker, name='service_worker'),
     path('', views.index, name='index'),
 ]
\ No newline at end of file
@@ -1,99 +1,89 @@
 # main/views.py
-import calendar
 from datetime import datetime, date
-from django.http import JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
 from django.utils.decorators import method_decorator
 import json
 from django.db import models
 
-from .models import CoffeeShop, Shift, Worker, SwapCounter
+from .bulk import apply_edits
+from .idempotency import idempotent
+from .journal import HISTORY_PAGE, actor_of, change_history
+from .swaps import increment_swaps
+from .middleware import perf_report
+from .models import CoffeeShop, Worker
+from .cache import (
+    get_schedule, bump_schedule_version, schedule_token, range_token, coffee_shops_version,
+    prefetch_adjacent,
+)
+from .pubsub import get_broker, publish_schedule_event, schedule_channel
+from .coverage import network_coverage
+from .conflicts import borrowed_on, month_conflicts
+from .payroll import payroll_rows, payroll_totals
+from .archive import summaries_by_cafe
+from .importer import import_schedule
+from .export import async_stream, csv_stream, payroll_export_rows, schedule_rows, xlsx_stream
+from .scheduler import generate_month
+from .schedule import build_schedule_range, compact_schedule, month_bounds, parse_span, schedule_changes, span_bounds
 from django.shortcuts import render
 
+STREAM_HEARTBEAT = 15
+SCHEDULE_FORMATS = ('', 'compact')
+EXPORT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
 def index(request):
     cafes = CoffeeShop.objects.all()
     return render(request, 'main/index.html', {'cafes':cafes})
 
+def schedule_etag(request, cafe_id):
+    try:
+        kind, span = parse_span(request.GET)
+    except (KeyError, ValueError):
+        return None
+    token = range_token(cafe_id, *span) if kind == 'range' else schedule_token(cafe_id, *span)
+    # форматы одного месяца — разные представления, ETag у них разный
+    fmt = request.GET.get('format')
+    return f"{token}-{fmt}" if fmt else token
+
+
+def coffee_shops_etag(request):
+    return str(coffee_shops_version())
+
+
+@gzip_page
+@cache_control(no_cache=True)
+@condition(etag_func=schedule_etag)
 def get_schedule_data(request, cafe_id):
+    fmt = request.GET.get('format', '')
+    if fmt not in SCHEDULE_FORMATS:
+        return JsonResponse({'error': f'Неизвестный формат {fmt}'}, status=400)
     try:
-        cafe = get_object_or_404(CoffeeShop, id=cafe_id)
-        today = date.today()
-        year = today.year
-        month = today.month
-
-        days_in_month = calendar.monthrange(year, month)[1]
-        first_weekday = calendar.monthrange(year, month)[0]
-
-
-        weekdays = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
-        header = []
-        for day in range(1, days_in_month + 1):
-            weekday_index = (first_weekday + day - 1) % 7
-            header.append({
-                'day': day,
-                'weekday': weekdays[weekday_index],
-                'date': f"{year}-{month:02d}-{day:02d}"
-            })
-
-        workers = Worker.objects.filter(coffee_shop=cafe)
-
-        shifts_in_month = Shift.objects.filter(
-            worker__in=workers,
-            date__year=year,
-            date__month=month
-        )
+        kind, span = parse_span(request.GET)
+    except (KeyError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-        worker_count_per_day = {}
-        for day in range(1, days_in_month + 1):
-            d = date(year, month, day)
-            count = shifts_in_month.filter(date=d).filter(models.Q(start_time__isnull=False) | models.Q(other_coffee_shop__isnull=False)).count()
-            worker_count_per_day[d] = count
-
-        rows = []
-        for worker in workers:
-            counter, _ = SwapCounter.objects.get_or_create(
-                worker=worker,
-                month=date(year, month, 1),
-                defaults={'swaps_this_month': 0}
-            )
-
-            row_data = []
-            for day_info in header:
-                d = date.fromisoformat(day_info['date'])
-                try:
-                    shift = Shift.objects.get(worker=worker, date=d)
-                    if shift.display_value:
-                        cell_value = shift.display_value
-                    elif shift.other_coffee_shop:
-                        cell_value = f"+ {shift.other_coffee_shop.short_code}"
-                    elif shift.start_time:
-                        cell_value = shift.start_time
-                    else:
-                        cell_value = ''
-                except Shift.DoesNotExist:
-                    cell_value = ''
-                row_data.append(cell_value)
-
-            rows.append({
-                'id': worker.id,
-                'name': worker.name,
-                'data': row_data,
-                'swaps': counter.swaps_this_month
-            })
-
-        red_days = [
-            day_info['day'] for day_info in header
-            if worker_count_per_day.get(date.fromisoformat(day_info['date']), 0) < cafe.minimum_workers]
+    try:
+        load_cafe = lambda pk: get_object_or_404(CoffeeShop, id=pk)
+        encode = compact_schedule if fmt == 'compact' else (lambda payload: payload)
+        if kind == 'range':
+            return JsonResponse(encode(build_schedule_range(load_cafe(cafe_id), *span)))
 
-        return JsonResponse({
-            'cafe_name': cafe.name,
-            'header': header,
-            'rows': rows,
-            'red_days': red_days,
-            'minimum_required': cafe.minimum_workers,
-            'current_month': f"{year}-{month:02d}",
-        })
+        year, month = span
+        payload, hit = get_schedule(cafe_id, year, month, load_cafe)
+        if request.GET.get('prefetch'):
+            prefetch_adjacent(cafe_id, year, month, load_cafe)
+        response = JsonResponse(encode(payload))
+        response['X-Schedule-Cache'] = 'hit' if hit else 'miss'
+        return response
 
     except Exception as e:
         import traceback
@@ -101,55 +91,117 @@ def get_schedule_data(request, cafe_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def get_schedule_changes(request, cafe_id):
+    try:
+        cafe = get_object_or_404(CoffeeShop, id=cafe_id)
+        since = int(request.GET.get('since', 0))
+        kind, (year, month) = parse_span(request.GET)
+        if kind != 'month':
+            raise ValueError('Изменения отдаются только помесячно')
+        return JsonResponse(schedule_changes(cafe, year, month, since))
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+async def schedule_stream(request, cafe_id):
+    """
+    SSE-поток правок графика точки: события того же вида, что ответы
+    update_shift и increment_swap. Работает только под ASGI — под WSGI
+    бесконечный поток занял бы рабочий поток целиком.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Streaming requires ASGI'}, status=501)
+
+    async def events():
+        yield 'retry: 5000\n\n'
+        async for message in get_broker().listen(schedule_channel(cafe_id), heartbeat=STREAM_HEARTBEAT):
+            if message is None:
+                yield ': keepalive\n\n'
+            else:
+                yield f'data: {message}\n\n'
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @csrf_exempt
+@idempotent
 def update_shift(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Only POST allowed'}, status=405)
 
     try:
         data = json.loads(request.body)
-        worker_id = data['worker_id']
-        date_str = data['date']
-        start_time = data.get('start_time')
-        other_cafe_id = data.get('other_cafe_id')
-        display_value = data.get('display_value')
+        cells, days = apply_edits([{
+            'worker_id': data['worker_id'],
+            'date': data['date'],
+            'start_time': data.get('start_time'),
+            'other_cafe_id': data.get('other_cafe_id'),
+            'display_value': data.get('display_value'),
+        }], actor=actor_of(request))
+        return JsonResponse({'status': 'ok', 'cells': cells, 'days': days})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-        worker = Worker.objects.get(id=worker_id)
-        d = date.fromisoformat(date_str)
-
-        other_cafe = None
-        if other_cafe_id:
-            other_cafe = CoffeeShop.objects.get(id=other_cafe_id)
-
-        shift, created = Shift.objects.update_or_create(
-            worker=worker,
-            date=d,
-            defaults={
-                'coffee_shop': worker.coffee_shop,
-                'start_time': start_time,
-                'other_coffee_shop': other_cafe,
-                'display_value': display_value
-            }
-        )
 
-        check_and_notify_understaffed(worker.coffee_shop, d)
-        return JsonResponse({'status': 'ok'})
+@csrf_exempt
+@idempotent
+def bulk_update_shifts(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        changed, days = apply_edits(data['edits'], source='bulk', actor=actor_of(request))
+        return JsonResponse({'status': 'ok', 'changed': changed, 'days': days})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
+@csrf_exempt
+def import_schedule_csv(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST allowed'}, status=405)
 
-def check_and_notify_understaffed(cafe, d):
-    actual = Shift.objects.filter(coffee_shop=cafe, date=d, start_time__isnull=False).count()
+    try:
+        cafe = get_object_or_404(CoffeeShop, id=request.GET.get('cafe') or request.POST.get('cafe'))
+        upload = request.FILES.get('file')
+        raw = upload.read() if upload else request.body
+        dry_run = bool(request.GET.get('dry_run') or request.POST.get('dry_run'))
+        result = import_schedule(raw.decode('utf-8-sig').splitlines(), cafe, dry_run=dry_run,
+                                 actor=actor_of(request))
+        return JsonResponse({'status': 'ok', **result})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-    if actual < cafe.minimum_workers:
-        print(f"Недобор в {cafe.name} на {d}: {actual} < {cafe.minimum_workers}")
-        # здесь можно отправить push-уведомление через Web Push или FCM
-        # пока просто логируем — позже добавим реальные пушки
-    else:
-        # можно сбросить уведомление, если оно было
-        pass
+@csrf_exempt
+def generate_schedule(request, cafe_id):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST allowed'}, status=405)
+
+    try:
+        cafe = get_object_or_404(CoffeeShop, id=cafe_id)
+        data = json.loads(request.body or '{}')
+        kind, (year, month) = parse_span(data)
+        if kind != 'month':
+            raise ValueError('График составляется помесячно')
+        edits, hours, unfilled = generate_month(cafe, year, month, data.get('constraints'))
+        changed = []
+        if not data.get('dry_run'):
+            changed, _ = apply_edits(edits, source='generate', actor=actor_of(request))
+        return JsonResponse({
+            'status': 'ok',
+            'assignments': edits if data.get('dry_run') else len(edits),
+            'changed': changed,
+            'hours': hours,
+            'unfilled': [d.isoformat() for d in unfilled],
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
 @csrf_exempt
+@idempotent
 def increment_swap(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'POST only'}, status=405)
@@ -158,25 +210,147 @@ def increment_swap(request):
         data = json.loads(request.body)
         worker_id = data['worker_id']
         worker = Worker.objects.get(id=worker_id)
-        today = date.today()
-        month_key = date(today.year, today.month, 1)
+        # месяц клика: правка из офлайн-очереди может дойти уже в следующем
+        if data.get('month'):
+            month_key = date.fromisoformat(data['month'] + '-01')
+        else:
+            today = date.today()
+            month_key = date(today.year, today.month, 1)
 
-        counter, _ = SwapCounter.objects.get_or_create(
-            worker=worker,
-            month=month_key,
-            defaults={'swaps_this_month': 0}
-        )
-        counter.swaps_this_month += 1
-        counter.save()
+        swaps = increment_swaps(worker.id, month_key, actor=actor_of(request), cafe_id=worker.coffee_shop_id)
+        bump_schedule_version(worker.coffee_shop_id, month_key)
+        patch = {
+            'worker_id': worker.id,
+            'month': f"{month_key.year}-{month_key.month:02d}",
+            'swaps': swaps,
+        }
+        publish_schedule_event(worker.coffee_shop_id, {'type': 'swaps', **patch})
 
-        return JsonResponse({'swaps': counter.swaps_this_month})
+        return JsonResponse(patch)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
+@cache_control(no_cache=True)
+@condition(etag_func=coffee_shops_etag)
 def get_coffee_shops(request):
     shops = CoffeeShop.objects.all()
     data = [{'id': s.id, 'short_code': s.short_code} for s in shops]
     return JsonResponse(data, safe=False)
 
+def get_network_coverage(request):
+    try:
+        kind, (year, month) = parse_span(request.GET)
+        if kind != 'month':
+            raise ValueError('Покрытие сети отдаётся помесячно')
+        start, end = month_bounds(year, month)
+        return JsonResponse({
+            'month': f"{year}-{month:02d}",
+            'days': end.day,
+            'shops': network_coverage(start, end),
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+def get_network_conflicts(request):
+    try:
+        kind, (year, month) = parse_span(request.GET)
+        if kind != 'month':
+            raise ValueError('Конфликты отдаются помесячно')
+        cafe_id = int(request.GET['cafe']) if request.GET.get('cafe') else None
+        return JsonResponse({
+            'month': f"{year}-{month:02d}",
+            'conflicts': month_conflicts(year, month, cafe_id),
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+def get_borrowed(request):
+    try:
+        d = date.fromisoformat(request.GET['date']) if request.GET.get('date') else date.today()
+        return JsonResponse({'date': d.isoformat(), 'borrowed': borrowed_on(d)})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+def get_network_history(request):
+    try:
+        start, end = span_bounds(request.GET)
+        return JsonResponse({
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'months': summaries_by_cafe(start, end),
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+def get_change_history(request):
+    try:
+        params = request.GET
+        optional = lambda name, parse: parse(params[name]) if params.get(name) else None
+        limit = min(int(params.get('limit', HISTORY_PAGE)), HISTORY_PAGE)
+        changes, next_after = change_history(
+            worker_id=optional('worker', int),
+            cafe_id=optional('cafe', int),
+            start=optional('from', date.fromisoformat),
+            end=optional('to', date.fromisoformat),
+            kind=params.get('kind') or None,
+            after=int(params.get('after', 0)),
+            limit=limit,
+        )
+        return JsonResponse({'changes': changes, 'next': next_after})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+def get_payroll(request):
+    try:
+        start, end = span_bounds(request.GET)
+        cafe_id = int(request.GET['cafe']) if request.GET.get('cafe') else None
+        rows = payroll_rows(start, end, cafe_id)
+        by_worker, by_cafe = payroll_totals(rows)
+        return JsonResponse({
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'rows': rows,
+            'workers': by_worker,
+            'shops': by_cafe,
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+def _export_response(request, name, make_rows):
+    """Выгрузка строк make_rows(start, end, cafe_id) в CSV или XLSX потоком."""
+    try:
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in EXPORT_TYPES:
+            raise ValueError(f"Неизвестный формат {fmt}")
+        start, end = span_bounds(request.GET)
+        cafe_id = int(request.GET['cafe']) if request.GET.get('cafe') else None
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    rows = make_rows(start, end, cafe_id)
+    stream = csv_stream(rows) if fmt == 'csv' else xlsx_stream(rows, name)
+    if isinstance(request, ASGIRequest):
+        stream = async_stream(stream)
+    response = StreamingHttpResponse(stream, content_type=EXPORT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{name}_{start}_{end}.{fmt}"'
+    return response
+
+def export_schedule(request):
+    return _export_response(request, 'schedule', schedule_rows)
+
+def export_payroll(request):
+    return _export_response(request, 'payroll', payroll_export_rows)
+
+@staff_member_required
+def get_perf_report(request):
+    return JsonResponse(perf_report())
+
+def service_worker(request):
+    """Service worker отдаётся с корня сайта, чтобы его scope покрывал и страницы, и /api/."""
+    response = render(request, 'main/sw.js', content_type='application/javascript')
+    response['Service-Worker-Allowed'] = '/'
+    response['Cache-Control'] = 'no-cache'
+    return response
+
 def schedule_view(request, cafe_id):
     return render(request, 'main/cafe/schedule.html', {'cafe_id': cafe_id})
\ No newline at end of file
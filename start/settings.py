@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Замер SQL и времени по запросам (Server-Timing, /api/perf/) — раскомментировать при необходимости
+    # 'main.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +53,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Настройки QueryInstrumentationMiddleware: доля замеряемых запросов,
+# сколько повторов одной формы SQL считать подозрением на N+1 и сколько
+# последних запросов на view держать в скользящей статистике.
+PERF_SAMPLE_RATE = 1.0
+PERF_DUPLICATE_THRESHOLD = 5
+PERF_WINDOW = 500
+
 ROOT_URLCONF = 'start.urls'
 
 TEMPLATES = [
@@ -73,14 +83,90 @@ WSGI_APPLICATION = 'start.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite под параллельными правками нескольких менеджеров:
+# WAL — читатели не блокируют писателя и наоборот; synchronous=NORMAL в WAL
+# не теряет целостность, только последние транзакции при отключении питания;
+# busy_timeout — ждать блокировку, а не сразу падать с «database is locked»;
+# mmap и cache_size держат горячие страницы в памяти.
+SQLITE_INIT_COMMAND = ';'.join([
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-64000',
+    'PRAGMA temp_store=MEMORY',
+])
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': SQLITE_INIT_COMMAND,
+            # транзакция сразу берёт блокировку записи: без этого BEGIN
+            # DEFERRED, начавшийся с чтения, при записи получает SQLITE_BUSY
+            # мимо busy_timeout. Режим действует на все atomic-блоки, но
+            # ATOMIC_REQUESTS выключен, а явные atomic есть только на путях
+            # записи (apply_edits, increment_swaps, idempotent, архивация,
+            # админка) — чтения графика идут в autocommit и BEGIN не делают.
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Постоянное соединение (и прогретый кеш страниц) — только под WSGI:
+        # под ASGI каждый поток sync_to_async держал бы своё соединение,
+        # Django такого не советует. Поэтому по умолчанию 0, а start/wsgi.py
+        # выставляет DB_CONN_MAX_AGE=600 до загрузки настроек.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+        # тестовая база — файл, а не память: в shared-cache памяти SQLite
+        # параллельные записи из потоков падают с «table is locked»
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Алиас из CACHES для графиков смен и время жизни записи в секундах.
+# Правки через update_shift/increment_swap инвалидируют запись сразу,
+# таймаут ограничивает устаревание после правок в админке.
+# В этом же кеше лежат версии графиков, из которых строятся ETag'и. LocMemCache
+# у каждого процесса свой: с несколькими воркерами правка, прошедшая через
+# один процесс, в других не видна, и они отдают старый график и 304.
+# LocMem годится только для одного процесса (runserver, один воркер);
+# для нескольких укажите общий бэкенд — Redis или Memcached
+# (manage.py check --deploy об этом предупредит).
+SCHEDULE_CACHE_ALIAS = 'default'
+SCHEDULE_CACHE_TIMEOUT = 300
+
+# Брокер для live-обновлений графика (/api/schedule/<cafe_id>/stream/, нужен ASGI).
+# InProcessBroker работает в пределах одного процесса; для нескольких
+# воркеров подставьте класс с тем же интерфейсом publish/listen.
+SCHEDULE_BROKER = 'main.pubsub.InProcessBroker'
+
+# Уведомления о недоборе: транспорт (класс с методом send(alert)) и сколько
+# секунд день должен простоять без правок, прежде чем о нём сообщат.
+# Рассылает manage.py drain_notifications --loop.
+NOTIFICATION_TRANSPORT = 'main.notifications.LogTransport'
+NOTIFICATION_DEBOUNCE = 60
+
+# Сколько месяцев (включая текущий) держать в Shift. Более старые
+# manage.py archive_shifts (раз в сутки по cron) переносит в ShiftArchive
+# и сворачивает в помесячные итоги. None — архивация выключена.
+ARCHIVE_KEEP_MONTHS = None
+
+# Сколько секунд хранить ключи Idempotency-Key у POST-правок. Офлайн-очередь
+# на странице переотправляет правки, пока ключ жив, повтор не выполнится
+# дважды. Старые ключи чистит manage.py prune_idempotency_keys.
+IDEMPOTENCY_TTL = 7 * 24 * 3600
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'start.settings')
+# под WSGI соединение с базой переживает запрос (см. DATABASES в settings)
+os.environ.setdefault('DB_CONN_MAX_AGE', '600')
 
 application = get_wsgi_application()